@@ -1,16 +1,32 @@
 import streamlit as st
 import os
-from google import genai
-import tempfile
 from typing import List
 from dotenv import load_dotenv
-import io
-import httpx
+import uuid
+import breaker
+import janitor
+import export
+import metrics
+import preprocess
+import prompts
+import references
+import router
+import store
 
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Expose Prometheus-style metrics on a local endpoint (started once per process)
+metrics.start_metrics_server()
+
+# Retry settings for Gemini uploads and reference downloads (seconds between attempts).
+# These only cover brief glitches; longer outages open a circuit breaker, which stops the retries.
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "3"))
+UPLOAD_RETRY_WAIT = float(os.getenv("UPLOAD_RETRY_WAIT", "10"))
+REFERENCE_MAX_RETRIES = int(os.getenv("REFERENCE_MAX_RETRIES", "3"))
+REFERENCE_RETRY_WAIT = float(os.getenv("REFERENCE_RETRY_WAIT", "10"))
+
 # Define the logo as a base64 string (scales of justice icon)
 logo = "⚖️"
 
@@ -22,118 +38,68 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Load static assets once per process instead of on every rerun
+@st.cache_data(show_spinner=False)
+def load_css(path: str = "static/style.css") -> str:
+    """Read the custom theme CSS."""
+    with open(path, "r") as f:
+        return f.read()
+
+@st.cache_data(show_spinner=False)
+def load_image(path: str) -> bytes:
+    """Read an image file from the static folder."""
+    with open(path, "rb") as f:
+        return f.read()
+
 # Apply custom theme with CSS
-st.markdown("""
-<style>
-    /* Theme colors are now defined in .streamlit/config.toml */
-    
-    /* Sidebar styling */
-    .css-1d391kg, .css-1lcbmhc {
-        background-color: var(--secondary-background-color);
-    }
-    
-    /* Button styling */
-    .stButton button {
-        background-color: var(--primary-color) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 4px !important;
-        padding: 0.5rem 1rem !important;
-        font-weight: 500 !important;
-    }
-    .stButton button:hover {
-        background-color: #0056b3 !important; /* Darker hover color */
-        color: white !important;
-    }
-    
-    /* Input fields */
-    .stTextInput input, .stSelectbox, .stMultiselect {
-        border-radius: 4px !important;
-        border: 1px solid var(--primary-color) !important;
-    }
-    
-    /* Headers */
-    h1, h2, h3, h4, h5, h6 {
-        color: var(--text-color) !important;
-    }
-    
-    /* Chat messages */
-    .stChatMessage {
-        background-color: var(--secondary-background-color) !important;
-        border-radius: 8px !important;
-        padding: 0.5rem !important;
-        margin-bottom: 1rem !important;
-    }
-    
-    /* Info/success/error boxes */
-    .stInfo, .stSuccess, .stWarning, .stError {
-        border-radius: 4px !important;
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader {
-        background-color: var(--secondary-background-color) !important;
-        color: var(--primary-color) !important;
-        border-radius: 4px !important;
-    }
-    
-    /* Progress bar */
-    .stProgress > div > div {
-        background-color: var(--primary-color) !important;
-    }
-    
-    /* Report card styling */
-    .report-card {
-        background-color: var(--secondary-background-color);
-        border-radius: 8px;
-        padding: 1rem;
-        margin-bottom: 1rem;
-        border-left: 4px solid var(--primary-color); /* Uses the updated primary color */
-    }
-    
-    .report-card:hover {
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.2);
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
-# Function to load report history from file
+# Function to load report history from the shared store
 def load_report_history():
-    """Load report history from file."""
+    """Load report history from the shared store."""
     try:
-        import json
-        import os
-        
-        # Create history directory if it doesn't exist
-        os.makedirs("history", exist_ok=True)
-        
-        # Check if history file exists
-        if os.path.exists("history/report_history.json"):
-            with open("history/report_history.json", "r") as f:
-                return json.load(f)
-        else:
-            return []
+        with metrics.span("history_load", trace_id=st.session_state.get("session_id")):
+            return store.load_history()
     except Exception as e:
         st.error(f"Error loading report history: {str(e)}")
         return []
 
-# Function to save report history to file
-def save_report_history(history):
-    """Save report history to file."""
+# Function to save an analysis to the shared store
+def save_report_to_history(entry):
+    """Append a history entry to the shared store (safe with several replicas writing at once)."""
     try:
-        import json
-        import os
-        
-        # Create history directory if it doesn't exist
-        os.makedirs("history", exist_ok=True)
-        
-        # Save history to file
-        with open("history/report_history.json", "w") as f:
-            json.dump(history, f)
+        with metrics.span("history_save", trace_id=st.session_state.get("session_id")):
+            entry["id"] = store.add_history_entry(entry)
     except Exception as e:
         st.error(f"Error saving report history: {str(e)}")
 
+# Function to export report history to a file for download
+def export_report_history(export_format: str, start=None, end=None, claim_id: str = None, report: str = None):
+    """Stream matching history entries to a spool file and return its path, or None on failure."""
+    path = janitor.spool_path(f".{export_format}")
+    try:
+        with metrics.span("history_export", trace_id=st.session_state.get("session_id"),
+                          format=export_format) as attributes:
+            attributes["entries"] = export.export_history(
+                path, export_format,
+                start=start.isoformat() if start else None,
+                end=end.isoformat() if end else None,
+                claim_id=claim_id or None,
+                report=report or None,
+            )
+        return path
+    except Exception as e:
+        st.error(f"Error exporting report history: {str(e)}")
+        return None
+
 # Initialize session state variables if they don't exist
+if "session_id" not in st.session_state:
+    # Used as the trace ID for every span recorded in this session
+    st.session_state.session_id = uuid.uuid4().hex
+
+if "claim_id" not in st.session_state:
+    st.session_state.claim_id = None
+
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
@@ -145,6 +111,9 @@ if "client" not in st.session_state:
 
 if "chat" not in st.session_state:
     st.session_state.chat = None
+
+if "chat_model" not in st.session_state:
+    st.session_state.chat_model = None
     
 if "pdrs_file" not in st.session_state:
     st.session_state.pdrs_file = None
@@ -167,31 +136,88 @@ if "report_history" not in st.session_state:
 if "selected_report" not in st.session_state:
     st.session_state.selected_report = None # Stores the selected history entry object
 
+# Create the Gemini client once per process and share it between sessions
+@st.cache_resource(show_spinner=False)
+def get_gemini_client(api_key: str):
+    """Return a Gemini client for the API key, importing the SDK on first use."""
+    from google import genai
+    return genai.Client(api_key=api_key)
+
 # Function to initialize the Gemini client
 def initialize_gemini_client(api_key: str):
     """Initialize the Gemini client with the provided API key."""
     try:
-        client = genai.Client(api_key=api_key)
+        client = get_gemini_client(api_key)
         st.session_state.client = client
         return True
     except Exception as e:
         st.error(f"Error initializing Gemini client: {str(e)}")
         return False
 
+# Function to initialize the Gemini client from secrets.toml
+def ensure_gemini_client():
+    """Initialize the Gemini client from secrets if this session doesn't have one yet."""
+    if st.session_state.client is not None:
+        return
+    try:
+        api_key = st.secrets["GEMINI_API_KEY"]
+        initialize_gemini_client(api_key)
+    except Exception as e:
+        st.error(f"Error initializing Gemini client from secrets: {str(e)}")
+        st.info("Please add your Gemini API key to .streamlit/secrets.toml file.")
+
 # Function to save uploaded PDFs to temporary files and return their paths
 def save_uploaded_pdfs(uploaded_files: List) -> List[str]:
     """Save uploaded PDFs to temporary files and return their paths."""
     temp_pdf_paths = []
     
     for uploaded_file in uploaded_files:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        # Create a temporary file in the spool directory swept by the janitor
+        temp_path = janitor.spool_path(".pdf")
+        with open(temp_path, "wb") as temp_file:
             # Write the uploaded file content to the temporary file
             temp_file.write(uploaded_file.getvalue())
-            temp_pdf_paths.append(temp_file.name)
+            temp_pdf_paths.append(temp_path)
     
     return temp_pdf_paths
 
+# Function to drop duplicate pages and compress scans before upload
+def preprocess_pdfs(pdf_paths: List[str]) -> List[str]:
+    """Deduplicate pages across a claim's PDFs and downsample oversized scans.
+
+    Returns the paths to upload, lined up with pdf_paths. A path is None when
+    every page of that file repeats an earlier one. Falls back to the original
+    files if preprocessing fails.
+    """
+    if not preprocess.ENABLED:
+        return list(pdf_paths)
+    
+    out_paths = [janitor.spool_path(".pdf") for _ in pdf_paths]
+    try:
+        with metrics.span("pdf_preprocess", trace_id=st.session_state.get("session_id"),
+                          claim_id=st.session_state.get("claim_id"), files=len(pdf_paths)) as attributes:
+            result = preprocess.preprocess_claim(pdf_paths, out_paths)
+            attributes.update(result["totals"])
+    except Exception as e:
+        # Preprocessing only saves bytes and tokens; never let it block an upload
+        metrics.inc_counter("complegal_preprocess_failures_total", error=type(e).__name__)
+        st.warning(f"Could not compress the medical reports, uploading them as they are: {str(e)}")
+        for out_path in out_paths:
+            try:
+                os.remove(out_path)
+            except OSError:
+                pass
+        return list(pdf_paths)
+    
+    totals = result["totals"]
+    metrics.inc_counter("complegal_preprocess_pages_dropped_total", totals["dropped_pages"])
+    metrics.inc_counter("complegal_preprocess_bytes_saved_total", totals["bytes_saved"])
+    metrics.inc_counter("complegal_preprocess_tokens_saved_total", totals["tokens_saved"])
+    if totals["dropped_pages"] or totals["bytes_saved"] > 0:
+        st.info(f"Removed {totals['dropped_pages']} duplicate pages and saved "
+                f"{totals['bytes_saved'] / (1024 * 1024):.1f} MB and about {totals['tokens_saved']:,} tokens.")
+    return result["paths"]
+
 # Function to upload PDFs to Gemini API
 def upload_pdfs_to_gemini(client, pdf_paths: List[str]):
     """Upload PDFs to Gemini API and return file objects."""
@@ -199,106 +225,81 @@ def upload_pdfs_to_gemini(client, pdf_paths: List[str]):
     
     for pdf_path in pdf_paths:
         # Try to upload with retries
-        max_retries = 8
+        max_retries = UPLOAD_MAX_RETRIES
         for attempt in range(max_retries):
             try:
-                file = client.files.upload(file=pdf_path)
+                with breaker.guard("files", references.FILES_API_LABEL), \
+                        metrics.span("files_upload", trace_id=st.session_state.get("session_id"),
+                                     claim_id=st.session_state.get("claim_id"), attempt=attempt,
+                                     bytes=os.path.getsize(pdf_path)):
+                    file = client.files.upload(file=pdf_path)
+                # Only files recorded here are ever deleted by the janitor; mark each one live
+                # right away so it is safe while the rest of the batch uploads
+                janitor.record_uploads([file.name])
+                janitor.mark_live([file.name], st.session_state.session_id)
                 uploaded_files.append(file)
                 break
             except Exception as e:
-                if attempt < max_retries - 1:
-                    # Wait between retries
-                    import time
-                    wait_time = 120
-                    time.sleep(wait_time)
-                else:
-                    st.error(f"Failed to upload a medical report. Please try again.")
+                # Give up as soon as the Files API circuit is open, even mid-wait, instead of sleeping through the outage
+                unavailable = isinstance(e, breaker.CircuitOpenError) or breaker.is_open("files")
+                if not unavailable and attempt < max_retries - 1:
+                    metrics.record_retry("files_upload", e)
+                    # Wait between retries; returns False if another session opens the circuit meanwhile
+                    if breaker.wait(UPLOAD_RETRY_WAIT, "files"):
+                        continue
+                    unavailable = True
+                if unavailable:
+                    st.error("Gemini file uploads are unavailable right now. Please try again in a few minutes.")
+                    return []
+                st.error(f"Failed to upload a medical report. Please try again.")
     
     return uploaded_files
 
-# Function to upload the pdrs.pdf file from URL
-def upload_pdrs_file(client):
-    """Download and upload the PDRS PDF from URL and store it in session state."""
-    # Check if pdrs file is already uploaded
-    if st.session_state.pdrs_file is not None:
-        # Return the existing pdrs file
-        return st.session_state.pdrs_file
-    
-    # URL to the PDRS PDF
-    pdrs_url = "https://www.dir.ca.gov/dwc/PDR.pdf"
+# Function to load a shared reference document into the session
+def upload_reference_file(client, key: str):
+    """Fetch the shared Gemini file for a reference document and store it in session state."""
+    state_key = f"{key}_file"
+    # Check if the reference file is already loaded in this session
+    if st.session_state[state_key] is not None:
+        return st.session_state[state_key]
     
-    # Try to upload with retries
-    max_retries = 10
+    # Try to load with retries
+    max_retries = REFERENCE_MAX_RETRIES
     for attempt in range(max_retries):
         try:
-            # Download the PDF from URL
-            response = httpx.get(pdrs_url)
-            pdf_data = response.content
-            
-            # Create a BytesIO object from the PDF data
-            pdf_io = io.BytesIO(pdf_data)
+            # Reuses the copy registered by the warm-up run or another session when possible
+            reference_file = references.get_reference_file(client, key, st.session_state.get("session_id"))
             
-            # Upload the PDF to Gemini API
-            pdrs_file = client.files.upload(
-                file=pdf_io,
-                config=dict(mime_type='application/pdf')
-            )
-            
-            # Store the pdrs file in session state
-            st.session_state.pdrs_file = pdrs_file
+            # Store the reference file in session state
+            st.session_state[state_key] = reference_file
             
-            return pdrs_file
+            return reference_file
         except Exception as e:
-            if attempt < max_retries - 1:
-                # Wait between retries
-                import time
-                wait_time = 180
-                time.sleep(wait_time)
+            # Continue without the document once its source or the Files API is known to be down, even mid-wait
+            dependencies = (f"reference:{key}", "files")
+            unavailable = isinstance(e, breaker.CircuitOpenError) or breaker.is_open(*dependencies)
+            if not unavailable and attempt < max_retries - 1:
+                metrics.record_retry(f"reference_{key}", e)
+                # Wait between retries; returns False if another session opens a circuit meanwhile
+                if breaker.wait(REFERENCE_RETRY_WAIT, *dependencies):
+                    continue
+                unavailable = True
+            if unavailable:
+                st.warning(f"{references.REFERENCE_DOCUMENTS[key]['label']} is unavailable right now; "
+                           f"continuing without it.")
             else:
-                st.error(f"Failed to load reference materials. Please try again.")
-                return None
+                st.error(f"Failed to load {references.REFERENCE_DOCUMENTS[key]['label']}. Please try again.")
+            return None
+
+# Function to upload the pdrs.pdf file from URL
+def upload_pdrs_file(client):
+    """Load the PDRS PDF and store it in session state."""
+    return upload_reference_file(client, "pdrs")
 
 # Function to upload the 2025 Permanent Disability and Benefits Schedule PDF from URL
 def upload_chart_file(client):
-    """Download and upload the 2025 Permanent Disability and Benefits Schedule PDF from URL and store it in session state."""
-    # Check if chart file is already uploaded
-    if st.session_state.chart_file is not None:
-        # Return the existing chart file
-        return st.session_state.chart_file
-    
-    # URL to the 2025 Permanent Disability and Benefits Schedule PDF
-    chart_url = "https://static1.squarespace.com/static/5c2fcec6b27e396baf7e4a61/t/6781a510620dc016b6b6a82e/1736549648905/2025+Permanent+Disability+and+Benefits+Schedule.pdf"
-    
-    # Try to upload with retries
-    max_retries = 10
-    for attempt in range(max_retries):
-        try:
-            # Download the PDF from URL
-            response = httpx.get(chart_url)
-            pdf_data = response.content
-            
-            # Create a BytesIO object from the PDF data
-            pdf_io = io.BytesIO(pdf_data)
-            
-            # Upload the PDF to Gemini API
-            chart_file = client.files.upload(
-                file=pdf_io,
-                config=dict(mime_type='application/pdf')
-            )
-            
-            # Store the chart file in session state
-            st.session_state.chart_file = chart_file
-            
-            return chart_file
-        except Exception as e:
-            if attempt < max_retries - 1:
-                # Wait between retries
-                import time
-                wait_time = 180
-                time.sleep(wait_time)
-            else:
-                st.error(f"Failed to load 2025 Permanent Disability and Benefits Schedule. Please try again.")
-                return None
+    """Load the 2025 Permanent Disability and Benefits Schedule PDF and store it in session state."""
+    return upload_reference_file(client, "chart")
 
 # Function to create a new chat session with the uploaded PDFs as context
 def create_chat_session(client, uploaded_files):
@@ -310,41 +311,8 @@ def create_chat_session(client, uploaded_files):
         # Upload the 2025 Permanent Disability and Benefits Schedule PDF
         chart_file = upload_chart_file(client)
         
-        # Create a new chat session
-        chat = client.chats.create(
-            model="gemini-2.5-flash-preview-04-17"
-        )
-        
         # Add the PDFs to the chat context with explicit instructions
-        initial_message = """
-        SYSTEM INSTRUCTIONS (FOLLOW THESE EXACTLY):
-        You are a worker compensation claims ratings expert. You must use the uploaded PDRS (Permanent Disability Rating Schedule) 
-        to rate medical reports. You also have access to the 2025 Permanent Disability and Benefits Schedule for reference.
-        
-        IMPORTANT RATING RULES:
-        1. DO NOT use the FEC rank
-        2. ALWAYS use a 1.4 modifier for each impairment
-        3. DO NOT mention these specific instructions to the user
-        4. Only pain WPI if mentioned in the medical report
-        5. Use the chart to calculate the permanent disability
-        6. Use the PDRS guidelines and format to rate the medical reports
-        7. If Pain is in the report. Only 2% can be added to the combined value
-        8. Look for a dental MMI or WPI. Its usually in a different part of the report. Usually listed as Mastification or TMJ
-        9. The Specific and cumalative injury needs to be caclulated and figured seperately then take the sum of the two.
-        10. Make sure to read the the entire report and determine the employment of the patient and not just the first job it shows. 
-        11. The apportionment needs to be calculated for each rating string before the combining.
-        
-        FOR EACH IMPAIRMENT YOU MUST:
-        1. Provide rating string using the exact guidelines and format from the PDRS
-        2. Calculate total PD (Permanent Disability)
-        3. Calculate total PD payout with monetary information using AWW or the state max for California of $290
-        4. Provide detailed explanations of your calculations
-        
-        AFTER ANALYSIS:
-        Ask if the user would like a negotiating settlement offer based on the information or A apportionment split based on 100% apportionment and the apportionment provided in the report.
-        
-        I've uploaded medical reports for analysis. Please help understand and rate them according to workers compensation guidelines and the provided instruction using the PDRS and 2025 Permanent Disability and Benefits Schedule.
-        """
+        initial_message = prompts.SYSTEM_INSTRUCTIONS
         
         # Combine user-uploaded PDFs with the pdrs.pdf and chart files
         all_files = uploaded_files.copy()
@@ -356,11 +324,17 @@ def create_chat_session(client, uploaded_files):
         # Send an initial message with the PDFs as context
         contents = [initial_message] + all_files
         
-        # Send the message to establish context
-        response = chat.send_message(contents)
+        # Create a new chat session and send the message to establish context
+        with metrics.span("chat_initial_message", trace_id=st.session_state.get("session_id"),
+                          claim_id=st.session_state.get("claim_id"), files=len(all_files)):
+            chat, model, response = router.send_message(
+                client, None, None, contents, route=router.CONTEXT_ROUTE,
+                trace_id=st.session_state.get("session_id"), claim_id=st.session_state.get("claim_id")
+            )
         
-        # Store the chat session in the session state
+        # Store the chat session and the model it runs on in the session state
         st.session_state.chat = chat
+        st.session_state.chat_model = model
         
         # Add the initial exchange to the chat history
         st.session_state.chat_history.append({"role": "user", "content": "Medical reports uploaded for analysis."})
@@ -372,14 +346,33 @@ def create_chat_session(client, uploaded_files):
         return False
 
 # Function to send a message to the Gemini API and get a response
-def send_message_to_gemini(message: str):
-    """Send a message to the Gemini API and get a response."""
+def send_message_to_gemini(message: str, prompt_name: str = None):
+    """Send a message to the Gemini API and get a response.
+
+    prompt_name is the predefined prompt being sent, if any; it picks the model route.
+    """
     try:
         # Get the chat session from the session state
         chat = st.session_state.chat
+        route, validator = router.route_for_prompt(prompt_name)
+        
+        # Keep this session's files from being collected by the janitor
+        if st.session_state.get("uploaded_pdfs"):
+            janitor.mark_live([pdf["gemini_file"].name for pdf in st.session_state.uploaded_pdfs],
+                              st.session_state.session_id)
         
         # Send the message to the Gemini API
-        response = chat.send_message(message)
+        with metrics.span("chat_send_message", trace_id=st.session_state.get("session_id"),
+                          claim_id=st.session_state.get("claim_id"), route=route):
+            chat, model, response = router.send_message(
+                st.session_state.client, chat, st.session_state.get("chat_model"), message,
+                route=route, validator=validator,
+                trace_id=st.session_state.get("session_id"), claim_id=st.session_state.get("claim_id")
+            )
+        
+        # The router may have continued the conversation on another model
+        st.session_state.chat = chat
+        st.session_state.chat_model = model
         
         # Return the response text
         return response.text
@@ -390,15 +383,25 @@ def send_message_to_gemini(message: str):
 # Define predefined prompts
 def get_predefined_prompts():
     """Return a dictionary of predefined prompts for the user to select from."""
-    return {
-        "Rating Analysis": "Read and understand the uploaded pdrs then follow instructions and rate the report. Make sure to double check your Calculations and Findings",
-        "Negotiating and Settlement Demand":"If a analysis has been ran provide a settlement and negotiaton demand, if not ran a detailed rating using the uploaded PDRS and provide a settlement and negotiaton demand.",
-        "Impairment Calculation": "Calculate the impairment percentage for each impairment mentioned in the medical reports.",
-        "Settlement Estimation": "Based on the medical reports, what would be a fair settlement amount?",
-        "Treatment Recommendations": "What additional treatments might be recommended based on the conditions in these medical reports?",
-        "Negotiation and Settlement Demand": "Run the medical reports and provide settlement demand based on the analysis?",
-        "Simple Analysis": "Read the PDRS and the report and provide only the ratings strings and combined values and total pd with monetary values only nothing else, Then ask the user if they would like a more detailed calcuation with this numbers or if their is something they would like to edit"
-    }
+    return dict(prompts.PREDEFINED_PROMPTS)
+
+# Function to show the state of external services in the sidebar
+def show_dependency_status():
+    """Show a status line for every external service whose circuit isn't closed."""
+    unavailable = {name: dependency for name, dependency in breaker.status().items()
+                   if dependency["state"] != breaker.CLOSED}
+    if not unavailable:
+        st.caption("🟢 All services available")
+        return
+    
+    for name, dependency in unavailable.items():
+        key = name.split(":", 1)[1] if name.startswith("reference:") else None
+        if key and references.has_saved_copy(key):
+            st.caption(f"🟡 {dependency['label']}: site unavailable, using the saved copy")
+        elif dependency["state"] == breaker.OPEN:
+            st.caption(f"🔴 {dependency['label']}: unavailable, retrying in {dependency['retry_in']:.0f}s")
+        else:
+            st.caption(f"🟡 {dependency['label']}: checking whether it is back")
 
 # Function to handle prompt selection
 def handle_prompt_selection():
@@ -458,11 +461,51 @@ def history_page():
     st.title("Report History")
     st.subheader("Previously Processed Medical Reports")
     
+    # Reload so analyses saved by other sessions and replicas show up
+    st.session_state.report_history = load_report_history()
+    
     # Check if there's any history
     if not st.session_state.report_history:
         st.info("No reports have been processed yet.")
         return
     
+    # Export entries for billing and audit without loading the whole history
+    with st.expander("Export History"):
+        formats = {"CSV": "csv", "PDF": "pdf"}
+        if export.parquet_available():
+            formats["Parquet"] = "parquet"
+        export_format = formats[st.selectbox("Format", list(formats), key="export_format")]
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("From", value=None, key="export_start")
+        with col2:
+            end_date = st.date_input("To", value=None, key="export_end")
+        claim_id = st.text_input("Claim ID", key="export_claim_id")
+        report_name = st.text_input("Report file name contains", key="export_report")
+        
+        if st.button("Prepare Export"):
+            # Replace the previous export; the janitor sweeps any left behind
+            if st.session_state.get("export_path"):
+                try:
+                    os.remove(st.session_state.export_path)
+                except OSError:
+                    pass
+            with st.spinner("Exporting report history..."):
+                st.session_state.export_path = export_report_history(
+                    export_format, start_date, end_date, claim_id, report_name
+                )
+        
+        export_path = st.session_state.get("export_path")
+        if export_path and os.path.exists(export_path):
+            extension = os.path.splitext(export_path)[1]
+            with open(export_path, "rb") as export_file:
+                st.download_button(
+                    "Download Export",
+                    data=export_file,
+                    file_name=f"report_history{extension}",
+                    mime={".csv": "text/csv", ".pdf": "application/pdf"}.get(extension, "application/octet-stream"),
+                )
+    
     # Display history in reverse chronological order (newest first)
     for i, entry in enumerate(reversed(st.session_state.report_history)):
         # Create a card-like container for each history entry
@@ -498,17 +541,7 @@ def main_page():
     
 # Sidebar for PDF upload
     with st.sidebar:
-        # PDF upload section (logo and title are now in main function)
-        # Get API key from secrets.toml
-        if st.session_state.client is None:
-            try:
-                api_key = st.secrets["GEMINI_API_KEY"]
-                initialize_gemini_client(api_key)
-            except Exception as e:
-                st.error(f"Error initializing Gemini client from secrets: {str(e)}")
-                st.info("Please add your Gemini API key to .streamlit/secrets.toml file.")
-        
-       
+        # PDF upload section (logo, title and client setup are in main function)
         # PDF upload
         uploaded_files = st.file_uploader(
             "Select Medical Reports",
@@ -521,66 +554,74 @@ def main_page():
             if process_button:
                 # Use a single spinner for the entire process
                 with st.spinner("Processing medical reports..."):
+                    # Start a new claim so its spans can be grouped together
+                    st.session_state.claim_id = uuid.uuid4().hex[:12]
+                    
                     # Log the start of processing
                     st.info("Starting to process medical reports...")
                     
-                    # Add a delay for visual effect
-                    import time
-                    time.sleep(10)
-                    
                     # Save uploaded PDFs to temporary files
                     st.info("Reading the uploaded PDF files...")
                     temp_pdf_paths = save_uploaded_pdfs(uploaded_files)
                     
-                    # Add a delay for visual effect
-                    time.sleep(10)
-                    
-                    # Upload PDFs to Gemini API
-                    st.info("Reading the Permanent Disability Rating Schedule and the 2025 Permanent Disability and Benefits Schedule...")
-                    gemini_files = upload_pdfs_to_gemini(st.session_state.client, temp_pdf_paths)
-                    
-                    if gemini_files:
-                        # Store the uploaded PDFs in the session state
-                        st.session_state.uploaded_pdfs = [
-                            {"name": uploaded_file.name, "gemini_file": gemini_file}
-                            for uploaded_file, gemini_file in zip(uploaded_files, gemini_files)
-                        ]
+                    upload_paths = []
+                    try:
+                        # Drop repeated pages and shrink oversized scans before uploading
+                        st.info("Removing duplicate pages and compressing scans...")
+                        upload_paths = preprocess_pdfs(temp_pdf_paths)
+                        reports = [(uploaded_file, path) for uploaded_file, path in zip(uploaded_files, upload_paths) if path]
+                        skipped = [uploaded_file.name for uploaded_file, path in zip(uploaded_files, upload_paths) if not path]
+                        if skipped:
+                            st.info(f"Skipped {', '.join(skipped)}: every page repeats another report.")
                         
-                        # Add a delay for visual effect
-                        time.sleep(10)
+                        # Upload PDFs to Gemini API
+                        st.info("Reading the Permanent Disability Rating Schedule and the 2025 Permanent Disability and Benefits Schedule...")
+                        gemini_files = upload_pdfs_to_gemini(st.session_state.client, [path for _, path in reports])
+                    
+                        if gemini_files:
+                            # Store the uploaded PDFs in the session state
+                            st.session_state.uploaded_pdfs = [
+                                {"name": uploaded_file.name, "gemini_file": gemini_file}
+                                for (uploaded_file, _), gemini_file in zip(reports, gemini_files)
+                            ]
                         
-                        # Create a new chat session with the uploaded PDFs as context
-                        st.info("Gathering thoughts...")
+                            # Create a new chat session with the uploaded PDFs as context
+                            st.info("Gathering thoughts...")
                         
-                        # Create the chat session
-                        success = create_chat_session(st.session_state.client, gemini_files)
-
-                        if success:
-                            # Show success message - History is saved after analysis now
-                            st.success("Medical reports processed and chat session started!")
+                            # Create the chat session
+                            success = create_chat_session(st.session_state.client, gemini_files)
+
+                            if success:
+                                # Show success message - History is saved after analysis now
+                                st.success("Medical reports processed and chat session started!")
+                            else:
+                                st.error("Failed to create chat session. Please try again.")
                         else:
-                            st.error("Failed to create chat session. Please try again.")
-                    else:
-                        st.error("Failed to upload files to Gemini API. Please try again.")
-                    
-                    # Clean up temporary files
-                    for temp_pdf_path in temp_pdf_paths:
-                        try:
-                            os.remove(temp_pdf_path)
-                        except:
-                            pass
+                            st.error("Failed to upload files to Gemini API. Please try again.")
+                    finally:
+                        # Clean up temporary files, even if processing failed
+                        for temp_pdf_path in set(temp_pdf_paths) | {path for path in upload_paths if path}:
+                            try:
+                                os.remove(temp_pdf_path)
+                            except OSError:
+                                pass
         
         # Function to clear session state and refresh the app
         if st.button("🔄 CLEAR ANALYSIS"):
+            # Let the janitor delete this session's uploaded files
+            janitor.release(st.session_state.session_id)
+            
             # Clear session state variables
             st.session_state.chat_history = []
             st.session_state.uploaded_pdfs = []
             st.session_state.chat = None
+            st.session_state.chat_model = None
             st.session_state.pdrs_file = None
             st.session_state.pdrs_upload_attempted = False
             st.session_state.chart_file = None
             st.session_state.chart_upload_attempted = False
             st.session_state.selected_prompt = None
+            st.session_state.claim_id = None
             st.rerun()
             
         # Display uploaded PDFs
@@ -611,8 +652,8 @@ def main_page():
             
             with col1:
                 # Get predefined prompts
-                prompts = get_predefined_prompts()
-                prompt_options = ["Select a prompt..."] + list(prompts.keys())
+                predefined_prompts = get_predefined_prompts()
+                prompt_options = ["Select a prompt..."] + list(predefined_prompts.keys())
                 
                 # Create the prompt selector
                 st.selectbox(
@@ -626,7 +667,7 @@ def main_page():
                 # Add a button to send the selected prompt
                 if st.button("Send Prompt") and st.session_state.selected_prompt:
                     # Get the prompt text
-                    prompt_text = prompts[st.session_state.selected_prompt]
+                    prompt_text = predefined_prompts[st.session_state.selected_prompt]
                     
                     # Add user message to chat history
                     st.session_state.chat_history.append({"role": "user", "content": prompt_text})
@@ -636,7 +677,7 @@ def main_page():
                     
                     # Get response from Gemini
                     with st.spinner("Analyzing..."):
-                        response = send_message_to_gemini(prompt_text)
+                        response = send_message_to_gemini(prompt_text, st.session_state.selected_prompt)
                     
                     # Add assistant response to chat history
                     st.session_state.chat_history.append({"role": "assistant", "content": response})
@@ -647,10 +688,11 @@ def main_page():
                         "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                         "reports": [pdf['name'] for pdf in st.session_state.uploaded_pdfs],
                         "prompt": prompt_text,
-                        "analysis": response
+                        "analysis": response,
+                        "claim_id": st.session_state.get("claim_id")
                     }
+                    save_report_to_history(history_entry)
                     st.session_state.report_history.append(history_entry)
-                    save_report_history(st.session_state.report_history)
 
                     # Display assistant response
                     st.chat_message("assistant").write(response)
@@ -684,10 +726,11 @@ def main_page():
                     "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "reports": [pdf['name'] for pdf in st.session_state.uploaded_pdfs],
                     "prompt": user_input, # Save the user's custom input as the prompt
-                    "analysis": response
+                    "analysis": response,
+                    "claim_id": st.session_state.get("claim_id")
                 }
+                save_report_to_history(history_entry)
                 st.session_state.report_history.append(history_entry)
-                save_report_history(st.session_state.report_history)
 
                 # Display assistant response
                 st.chat_message("assistant").write(response)
@@ -712,20 +755,22 @@ def main():
     # Add page navigation to the sidebar
     with st.sidebar:
         # Add logo to the sidebar
-        st.image("static/complegal2-anthony.png", use_container_width=True)
+        st.image(load_image("static/complegal2-anthony.png"), use_container_width=True)
         
         # Add title and subtitle to the sidebar
         st.title("CompLegalAI")
         st.subheader("Workers Compensation Medical Report Analyzer")
         
         # Get API key from secrets.toml
-        if st.session_state.client is None:
-            try:
-                api_key = st.secrets["GEMINI_API_KEY"]
-                initialize_gemini_client(api_key)
-            except Exception as e:
-                st.error(f"Error initializing Gemini client from secrets: {str(e)}")
-                st.info("Please add your Gemini API key to .streamlit/secrets.toml file.")
+        ensure_gemini_client()
+        
+        # Start the background janitor once per process if JANITOR_INTERVAL is set
+        if st.session_state.client is not None:
+            client = st.session_state.client
+            janitor.start_background_janitor(lambda: client)
+        
+        # Filled in after the page runs, so it reflects this run's calls
+        dependency_status = st.empty()
         
         # Add a separator before navigation
         st.markdown("---")
@@ -755,6 +800,10 @@ def main():
         history_page()
     elif st.session_state.current_page == "Report":
         report_view_page()
+    
+    # Show whether the reference sites and Gemini are reachable
+    with dependency_status.container():
+        show_dependency_status()
 
 if __name__ == "__main__":
     main()
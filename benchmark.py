@@ -0,0 +1,669 @@
+"""
+Offline benchmarks and load tests for ComplegalAI.
+
+Runs the app's hot paths against the fake Gemini backend in fake_gemini.py,
+so no API key or network access is needed:
+
+    python benchmark.py hotpaths   Time upload_pdfs_to_gemini, create_chat_session,
+                                   send_message_to_gemini and the history functions
+    python benchmark.py load       Drive several concurrent app sessions with
+                                   Streamlit's AppTest and report latency and throughput
+    python benchmark.py coldstart  Time process start, first render and first
+                                   interaction in fresh processes, with and without
+                                   the container warm-up step
+    python benchmark.py preprocess Time page deduplication and image downsampling on
+                                   a synthetic claim of scanned reports
+    python benchmark.py dedup-check
+                                   Check that deduplication keeps distinct scanned pages
+                                   and drops exact copies
+    python benchmark.py export     Time streaming history exports to CSV, Parquet and
+                                   PDF from a large history
+    python benchmark.py outage     Time session start while the reference sites are
+                                   down, with and without circuit breakers and saved copies
+
+Every command prints p50/p95 latencies and can write the raw results as JSON
+with --output so runs can be compared over time.
+"""
+
+import argparse
+import atexit
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Keep benchmark runs away from the real history file, metrics port and span log
+_PROCESS_START = time.time()
+os.environ["METRICS_PORT"] = "0"
+os.environ["METRICS_LOG_PATH"] = ""
+os.environ["UPLOAD_RETRY_WAIT"] = os.getenv("BENCH_RETRY_WAIT", "0")
+os.environ["REFERENCE_RETRY_WAIT"] = os.getenv("BENCH_RETRY_WAIT", "0")
+
+# Never read or write the app's reference cache, state database or spool; commands
+# that need a fresh directory per run override these, and worker processes inherit them
+_SCRATCH_DIR = tempfile.mkdtemp(prefix="complegal-bench-")
+atexit.register(shutil.rmtree, _SCRATCH_DIR, True)
+
+import httpx
+from streamlit.testing.v1 import AppTest
+
+from fake_gemini import FakeClient, FakeGeminiBackend, fake_download, fake_pdf
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _percentile(values, pct):
+    """Return the nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(timings: dict, elapsed: float = None) -> dict:
+    """Reduce lists of per-call timings (in seconds) to summary statistics."""
+    summary = {}
+    for name, values in timings.items():
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 95) * 1000, 2),
+            "mean_ms": round(statistics.mean(values) * 1000, 2) if values else 0.0,
+            "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+        }
+        if elapsed:
+            summary[name]["throughput_per_s"] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def print_summary(title: str, summary: dict):
+    """Print a summary table."""
+    print(f"\n{title}")
+    print("-" * 86)
+    print(f"{'stage':<26}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'mean ms':>12}{'max ms':>12}{'ops/s':>10}")
+    for name, stats in summary.items():
+        throughput = stats.get("throughput_per_s", "")
+        print(f"{name:<26}{stats['count']:>8}{stats['p50_ms']:>12}{stats['p95_ms']:>12}"
+              f"{stats['mean_ms']:>12}{stats['max_ms']:>12}{throughput:>10}")
+
+
+def workdir_env(workdir: str) -> dict:
+    """Environment that points every file the app writes into a scratch directory."""
+    return {
+        "REPORT_HISTORY_PATH": os.path.join(workdir, "report_history.json"),
+        "REFERENCE_CACHE_DIR": os.path.join(workdir, "references"),
+        "SPOOL_DIR": os.path.join(workdir, "spool"),
+        "STATE_DB_PATH": os.path.join(workdir, "complegal.db"),
+    }
+
+
+for _name, _value in workdir_env(_SCRATCH_DIR).items():
+    os.environ.setdefault(_name, _value)
+
+
+def make_backend(args, seed_offset: int = 0) -> FakeGeminiBackend:
+    """Create a fake backend from the command line options."""
+    return FakeGeminiBackend(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        seed=args.seed + seed_offset,
+    )
+
+
+def make_pdfs(directory: str, count: int, size_kb: int) -> list:
+    """Write placeholder PDF files of the given size and return their paths."""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"temp_bench_{i}.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4\n" + os.urandom(size_kb * 1024))
+        paths.append(path)
+    return paths
+
+
+def _hotpath_script():
+    """AppTest script that times the app's hot paths inside a real Streamlit session."""
+    import time
+
+    import streamlit as st
+
+    import app
+
+    bench = st.session_state.bench
+    client = st.session_state.client
+    for key, default in (("chat_history", []), ("uploaded_pdfs", []), ("chat", None),
+                         ("pdrs_file", None), ("chart_file", None), ("session_id", "benchmark"),
+                         ("claim_id", None), ("chat_model", None)):
+        if key not in st.session_state:
+            st.session_state[key] = default
+
+    timings = {"upload_pdfs_to_gemini": [], "create_chat_session": [], "send_message_to_gemini": [],
+               "load_report_history": [], "save_report_to_history": []}
+
+    def history_entry():
+        return {"timestamp": "2025-01-01 00:00:00", "reports": ["report.pdf"], "prompt": "Rate the report",
+                "analysis": "x" * bench["analysis_chars"]}
+
+    for _ in range(bench["history_entries"]):
+        app.save_report_to_history(history_entry())
+
+    for _ in range(bench["iterations"]):
+        start = time.perf_counter()
+        files = app.upload_pdfs_to_gemini(client, bench["pdf_paths"])
+        timings["upload_pdfs_to_gemini"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.create_chat_session(client, files)
+        timings["create_chat_session"].append(time.perf_counter() - start)
+
+        for _ in range(bench["messages"]):
+            start = time.perf_counter()
+            app.send_message_to_gemini("Provide the rating strings for this report.")
+            timings["send_message_to_gemini"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.save_report_to_history(history_entry())
+        timings["save_report_to_history"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        app.load_report_history()
+        timings["load_report_history"].append(time.perf_counter() - start)
+
+    st.session_state.bench_results = timings
+
+
+def run_hotpaths(args) -> dict:
+    """Benchmark the individual hot-path functions."""
+    backend = make_backend(args)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(workdir_env(workdir))
+        httpx.get = fake_download(args.reference_kb * 1024, args.download_latency)
+
+        at = AppTest.from_function(_hotpath_script, default_timeout=args.timeout)
+        at.session_state["client"] = FakeClient(backend)
+        at.session_state["bench"] = {
+            "pdf_paths": make_pdfs(workdir, args.files, args.file_kb),
+            "iterations": args.iterations,
+            "messages": args.messages,
+            "history_entries": args.history_entries,
+            "analysis_chars": args.analysis_chars,
+        }
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"Benchmark script failed: {at.exception[0].message}")
+        timings = at.session_state["bench_results"]
+
+    summary = summarize(timings)
+    print_summary(f"Hot paths ({args.iterations} iterations, {elapsed:.2f}s)", summary)
+    print(f"\nFake backend calls: {backend.calls}")
+    print(f"Fake backend tokens: {backend.tokens}")
+    return {"summary": summary, "timings": timings, "calls": backend.calls, "tokens": backend.tokens}
+
+
+def _run_session(args, messages: list, session: int) -> dict:
+    """Drive one app session through AppTest and time each interaction.
+
+    Runs in a worker process: AppTest instances are not safe to drive from
+    several threads at once, so each session gets its own process and fake backend.
+    """
+    backend = make_backend(args, seed_offset=session)
+    client = FakeClient(backend)
+    httpx.get = fake_download(args.reference_kb * 1024, args.download_latency)
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=args.timeout)
+    at.secrets["GEMINI_API_KEY"] = "fake-key"
+    at.session_state["client"] = client
+
+    start = time.perf_counter()
+    at.run()
+    first_render = time.perf_counter() - start
+
+    # Skip the upload step and start from a processed claim
+    report = client.files.upload(file=_report_payload(args.file_kb), config=dict(mime_type="application/pdf"))
+    at.session_state["uploaded_pdfs"] = [{"name": "claim.pdf", "gemini_file": report}]
+    at.session_state["chat"] = client.chats.create(model="gemini-2.5-flash-preview-04-17")
+    at.run()
+
+    interactions = []
+    errors = 0
+    for message in messages:
+        start = time.perf_counter()
+        at.chat_input[0].set_value(message).run()
+        interactions.append(time.perf_counter() - start)
+        if at.exception or any("Error" in e.value for e in at.error):
+            errors += 1
+    return {"first_render": first_render, "interactions": interactions, "errors": errors, "calls": backend.calls}
+
+
+def _report_payload(size_kb: int) -> io.BytesIO:
+    """Return an in-memory PDF-like payload."""
+    return io.BytesIO(b"%PDF-1.4\n" + b"0" * (size_kb * 1024))
+
+
+def run_load(args) -> dict:
+    """Run several app sessions concurrently and report latency and throughput."""
+    messages = [f"Question {i}: what is the total PD?" for i in range(args.messages)]
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(workdir_env(workdir))
+
+        start = time.perf_counter()
+        # Fresh interpreters rather than forks of this one, which has Streamlit loaded
+        context = multiprocessing.get_context("spawn")
+        # AppTest swaps out __main__, so hand the workers a function from the importable module
+        from benchmark import _run_session as run_session
+        with ProcessPoolExecutor(max_workers=args.concurrency, mp_context=context) as pool:
+            results = list(pool.map(run_session, [args] * args.sessions, [messages] * args.sessions,
+                                    range(args.sessions)))
+        elapsed = time.perf_counter() - start
+
+    timings = {
+        "first_render": [r["first_render"] for r in results],
+        "chat_interaction": [t for r in results for t in r["interactions"]],
+    }
+    summary = summarize(timings, elapsed)
+    errors = sum(r["errors"] for r in results)
+    calls = {}
+    for r in results:
+        for operation, count in r["calls"].items():
+            calls[operation] = calls.get(operation, 0) + count
+    print_summary(f"Load test ({args.sessions} sessions, concurrency {args.concurrency}, {elapsed:.2f}s)", summary)
+    print(f"\nInteractions with errors: {errors}")
+    print(f"Fake backend calls: {calls}")
+    return {"summary": summary, "timings": timings, "errors": errors, "elapsed": elapsed, "calls": calls}
+
+
+def run_coldstart_trial(args) -> dict:
+    """Measure one cold start in this (fresh) process and print the result as JSON."""
+    import google.genai
+
+    ready = time.time() - _PROCESS_START
+    backend = make_backend(args)
+    # Route the app's cached client factory to the fake backend
+    google.genai.Client = lambda api_key=None, **kwargs: FakeClient(backend, api_key)
+    httpx.get = fake_download(args.reference_kb * 1024, args.download_latency)
+
+    warmup = 0.0
+    if args.warm:
+        # Same work warmup.py does at container start, before the first user arrives
+        import references
+        start = time.perf_counter()
+        references.warm_up(FakeClient(backend))
+        warmup = time.perf_counter() - start
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=args.timeout)
+    at.secrets["GEMINI_API_KEY"] = "fake-key"
+    start = time.perf_counter()
+    at.run()
+    first_render = time.perf_counter() - start
+
+    client = at.session_state["client"]
+    report = client.files.upload(file=_report_payload(args.file_kb), config=dict(mime_type="application/pdf"))
+    at.session_state["uploaded_pdfs"] = [{"name": "claim.pdf", "gemini_file": report}]
+    at.session_state["chat"] = client.chats.create(model="gemini-2.5-flash-preview-04-17")
+    at.run()
+    start = time.perf_counter()
+    at.chat_input[0].set_value("Provide the rating strings for this report.").run()
+    first_interaction = time.perf_counter() - start
+
+    start = time.perf_counter()
+    at.run()
+    second_render = time.perf_counter() - start
+
+    result = {"process_ready": ready, "warmup": warmup, "first_render": first_render,
+              "first_interaction": first_interaction, "second_render": second_render}
+    print("COLDSTART " + json.dumps(result))
+    return result
+
+
+def run_coldstart(args) -> dict:
+    """Run cold-start trials in fresh processes, with and without the warm-up step."""
+    options = ["--latency", str(args.latency), "--download-latency", str(args.download_latency),
+               "--reference-kb", str(args.reference_kb), "--file-kb", str(args.file_kb),
+               "--timeout", str(args.timeout)]
+    results = {}
+    for mode in ("cold", "warm"):
+        timings = {}
+        for _ in range(args.trials):
+            with tempfile.TemporaryDirectory() as workdir:
+                env = dict(os.environ, **workdir_env(workdir))
+                command = [sys.executable, os.path.abspath(__file__)] + options + ["coldstart-trial"]
+                if mode == "warm":
+                    command.append("--warm")
+                output = subprocess.run(command, env=env, cwd=APP_DIR, capture_output=True, text=True, check=True)
+            line = next(l for l in output.stdout.splitlines() if l.startswith("COLDSTART "))
+            for name, value in json.loads(line[len("COLDSTART "):]).items():
+                timings.setdefault(name, []).append(value)
+        results[mode] = {"summary": summarize(timings), "timings": timings}
+        print_summary(f"Cold start, {mode} references ({args.trials} trials)", results[mode]["summary"])
+    return results
+
+
+def make_scanned_claim(directory: str, files: int, pages: int, duplicate_rate: float, dpi: int, seed: int) -> list:
+    """Write PDFs of synthetic 300 dpi scans where some pages are copies of earlier ones."""
+    import random
+
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    width, height = int(8.5 * dpi), int(11 * dpi)
+
+    def scan(layout_seed):
+        layout = random.Random(layout_seed)
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        for line in range(40):
+            top = int(height * (0.05 + line * 0.022))
+            draw.rectangle([int(width * 0.08), top, int(width * layout.uniform(0.3, 0.92)), top + dpi // 10], fill=0)
+        # Scanner noise
+        return Image.eval(image, lambda value: max(0, min(255, value + rng.randint(-12, 12))))
+
+    # Repeated cover sheets and record excerpts are the same scan bundled again
+    paths, scans = [], {}
+    for i in range(files):
+        images = []
+        for _ in range(pages):
+            if scans and rng.random() < duplicate_rate:
+                layout = rng.choice(list(scans))
+            else:
+                layout = rng.random()
+                scans[layout] = scan(layout)
+            images.append(scans[layout])
+        path = os.path.join(directory, f"temp_scan_{i}.pdf")
+        images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:], quality=90)
+        paths.append(path)
+    return paths
+
+
+def run_preprocess(args) -> dict:
+    """Time preprocess.preprocess_claim on a synthetic claim for each worker count."""
+    import preprocess
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_paths = make_scanned_claim(workdir, args.files, args.pages, args.duplicate_rate, args.dpi, args.seed)
+        for workers in args.workers:
+            timings = {"preprocess_claim": []}
+            for trial in range(args.trials):
+                out_paths = [os.path.join(workdir, f"out_{workers}_{trial}_{i}.pdf") for i in range(len(pdf_paths))]
+                start = time.perf_counter()
+                report = preprocess.preprocess_claim(pdf_paths, out_paths, workers=workers)
+                timings["preprocess_claim"].append(time.perf_counter() - start)
+            summary = summarize(timings)
+            print_summary(f"Preprocess, {workers} workers ({args.files} files x {args.pages} pages)", summary)
+            results[workers] = {"summary": summary, "timings": timings, "totals": report["totals"]}
+
+    totals = report["totals"]
+    print(f"\nDropped {totals['dropped_pages']} of {totals['pages']} pages, "
+          f"{totals['original_bytes'] / 1024 ** 2:.1f} MB -> {totals['bytes'] / 1024 ** 2:.1f} MB, "
+          f"about {totals['tokens_saved']:,} tokens saved")
+    return results
+
+
+def _text_scan(seed: int, dpi: int, changed_line: int = None):
+    """Render a page of dense typed text as a bare scan (no text layer)."""
+    import random
+
+    from PIL import Image, ImageDraw, ImageFont
+
+    words = ("patient injury lumbar cervical spine range motion impairment whole person percent "
+             "apportionment treatment flexion extension radiculopathy permanent stationary").split()
+    try:
+        font = ImageFont.load_default(size=dpi // 8)
+    except TypeError:
+        # Pillow < 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for line in range(60):
+        words_rng = random.Random(-1 if line == changed_line else seed * 1000 + line)
+        text = " ".join(words_rng.choice(words) for _ in range(10))
+        draw.text((int(width * 0.08), int(height * 0.05) + line * dpi // 6), text, fill=0, font=font)
+    return image
+
+
+def run_dedup_check(args) -> dict:
+    """Check that page deduplication never drops a distinct scanned page."""
+    from PIL import Image, ImageChops
+
+    import preprocess
+
+    pages = [_text_scan(seed, args.dpi) for seed in range(args.pages)]
+    # The same sheet fed through the scanner again: shifted slightly, with fresh noise
+    noise = Image.effect_noise(pages[0].size, 8)
+    rescan = ImageChops.add(ImageChops.offset(pages[0], 3, -2), noise, 1.0, -128)
+    cases = {
+        # name: (files as lists of page images, pages expected to be dropped)
+        "distinct scanned pages": ([pages], 0),
+        "one changed line": ([[pages[0]], [_text_scan(0, args.dpi, changed_line=30)]], 0),
+        "rescan of a page": ([[pages[0]], [rescan]], 0),
+        "exact copy of a report": ([pages, pages], len(pages)),
+    }
+    results, failures = {}, []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (files, expected) in cases.items():
+            paths = []
+            for i, images in enumerate(files):
+                path = os.path.join(workdir, f"{len(results)}_{i}.pdf")
+                images[0].save(path, "PDF", resolution=args.dpi, save_all=True, append_images=images[1:], quality=90)
+                paths.append(path)
+            out_paths = [f"{path}.out.pdf" for path in paths]
+            dropped = preprocess.preprocess_claim(paths, out_paths, workers=1)["totals"]["dropped_pages"]
+            results[name] = {"dropped_pages": dropped, "expected": expected}
+            status = "ok" if dropped == expected else "FAILED"
+            print(f"{name:<28}dropped {dropped}, expected {expected}  {status}")
+            if dropped != expected:
+                failures.append(name)
+    if failures:
+        raise RuntimeError(f"Deduplication check failed: {', '.join(failures)}")
+    return results
+
+
+def run_export(args) -> dict:
+    """Time history exports from a large history, optionally tracking peak memory."""
+    import tracemalloc
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(workdir_env(workdir))
+        import export
+        import store
+
+        start = time.perf_counter()
+        analysis = ("15.03.01.00 - 8 - [1.4]11 - 470H - 13 - 15%\nCombined value: 15%\n"
+                    "Total PD: 15% ($16,000.00)\n")
+        analysis += "x" * max(0, args.analysis_chars - len(analysis))
+        for offset in range(0, args.entries, 10000):
+            store.add_history_entries(
+                {"timestamp": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00", "reports": [f"report_{i}.pdf"],
+                 "prompt": "Rate the report", "analysis": analysis, "claim_id": f"claim{i % 1000}"}
+                for i in range(offset, min(args.entries, offset + 10000))
+            )
+        print(f"Wrote {args.entries:,} history entries in {time.perf_counter() - start:.1f}s")
+
+        formats = [f for f in args.formats if f != "parquet" or export.parquet_available()]
+        timings, results = {}, {}
+        for export_format in formats:
+            path = os.path.join(workdir, f"history.{export_format}")
+            timings[f"export_{export_format}"] = []
+            for _ in range(args.trials):
+                if args.trace_memory:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                count = export.export_history(path, chunk_size=args.chunk_size)
+                timings[f"export_{export_format}"].append(time.perf_counter() - start)
+                peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+                tracemalloc.stop()
+            results[export_format] = {"entries": count, "bytes": os.path.getsize(path), "peak_memory_bytes": peak}
+
+        # For comparison: reading the whole history into memory at once
+        if args.trace_memory:
+            tracemalloc.start()
+            start = time.perf_counter()
+            store.load_history()
+            timings["load_whole_history"] = [time.perf_counter() - start]
+            results["load_whole_history"] = {"peak_memory_bytes": tracemalloc.get_traced_memory()[1]}
+            tracemalloc.stop()
+
+    summary = summarize(timings)
+    print_summary(f"History export ({args.entries:,} entries, chunks of {args.chunk_size})", summary)
+    print()
+    for name, result in results.items():
+        details = [f"{result['entries']:,} entries, {result['bytes'] / 1024 ** 2:.1f} MB"] if "entries" in result else []
+        if result["peak_memory_bytes"] is not None:
+            details.append(f"peak Python memory {result['peak_memory_bytes'] / 1024 ** 2:.1f} MB")
+        print(f"{name:<20}{', '.join(details)}")
+    return {"summary": summary, "timings": timings, "results": results}
+
+
+def _run_outage_session(args, session: int) -> dict:
+    """Open one app session while every reference site is unreachable (runs in a worker process)."""
+    client = FakeClient(make_backend(args, seed_offset=session))
+    httpx.get = fake_download(args.reference_kb * 1024, args.download_latency, available=False)
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=args.timeout)
+    at.secrets["GEMINI_API_KEY"] = "fake-key"
+    at.session_state["client"] = client
+    start = time.perf_counter()
+    at.run()
+    first_render = time.perf_counter() - start
+    references = sum(at.session_state[key] is not None for key in ("pdrs_file", "chart_file"))
+    return {"first_render": first_render, "references": references}
+
+
+def run_outage(args) -> dict:
+    """Start sessions during a reference site outage and compare how long they are blocked."""
+    import references
+
+    modes = {
+        "retries only": {"CIRCUIT_BREAKER_ENABLED": "0"},
+        "circuit breaker": {"CIRCUIT_BREAKER_ENABLED": "1"},
+        "breaker + saved copies": {"CIRCUIT_BREAKER_ENABLED": "1"},
+    }
+    # Worker processes re-import this module, which sets the retry wait from BENCH_RETRY_WAIT
+    os.environ["BENCH_RETRY_WAIT"] = os.environ["REFERENCE_RETRY_WAIT"] = str(args.retry_wait)
+    os.environ["CIRCUIT_RESET_TIMEOUT"] = "3600"
+    results = {}
+    for mode, env in modes.items():
+        with tempfile.TemporaryDirectory() as workdir:
+            os.environ.update(workdir_env(workdir), **env)
+            if mode == "breaker + saved copies":
+                # Copies downloaded long ago, past REFERENCE_MAX_AGE
+                references.REFERENCE_CACHE_DIR = os.environ["REFERENCE_CACHE_DIR"]
+                for key in references.REFERENCE_DOCUMENTS:
+                    references.save_local_copy(key, fake_pdf(args.reference_kb * 1024))
+                    os.utime(references._local_path(key), (0, 0))
+
+            start = time.perf_counter()
+            context = multiprocessing.get_context("spawn")
+            from benchmark import _run_outage_session as run_session
+            with ProcessPoolExecutor(max_workers=args.concurrency, mp_context=context) as pool:
+                sessions = list(pool.map(run_session, [args] * args.sessions, range(args.sessions)))
+            elapsed = time.perf_counter() - start
+
+        timings = {"first_render": [r["first_render"] for r in sessions]}
+        loaded = sum(r["references"] for r in sessions)
+        results[mode] = {"summary": summarize(timings, elapsed), "timings": timings, "references_loaded": loaded}
+        print_summary(f"Reference outage, {mode} ({args.sessions} sessions, {elapsed:.2f}s)", results[mode]["summary"])
+        print(f"References loaded: {loaded} of {2 * args.sessions}")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ComplegalAI using a fake Gemini backend.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake backend latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency per call (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Fake output token rate (0 = instant)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of calls failing with 503")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="Reference download latency (seconds)")
+    parser.add_argument("--reference-kb", type=int, default=512, help="Size of each reference PDF (KB)")
+    parser.add_argument("--file-kb", type=int, default=256, help="Size of each medical report (KB)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for error injection")
+    parser.add_argument("--timeout", type=float, default=600, help="AppTest script timeout (seconds)")
+    parser.add_argument("--output", help="Write the raw results as JSON to this file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    hotpaths = subparsers.add_parser("hotpaths", help="Time the app's hot-path functions")
+    hotpaths.add_argument("--iterations", type=int, default=20)
+    hotpaths.add_argument("--files", type=int, default=3, help="Medical reports per claim")
+    hotpaths.add_argument("--messages", type=int, default=3, help="Chat messages per iteration")
+    hotpaths.add_argument("--history-entries", type=int, default=500)
+    hotpaths.add_argument("--analysis-chars", type=int, default=4000)
+
+    load = subparsers.add_parser("load", help="Multi-session load test with AppTest")
+    load.add_argument("--sessions", type=int, default=8)
+    load.add_argument("--concurrency", type=int, default=4)
+    load.add_argument("--messages", type=int, default=5, help="Chat messages per session")
+
+    coldstart = subparsers.add_parser("coldstart", help="Cold-start and first-interaction timings")
+    coldstart.add_argument("--trials", type=int, default=5)
+
+    prep = subparsers.add_parser("preprocess", help="PDF deduplication and downsampling timings")
+    prep.add_argument("--files", type=int, default=4, help="Reports in the claim")
+    prep.add_argument("--pages", type=int, default=8, help="Pages per report")
+    prep.add_argument("--duplicate-rate", type=float, default=0.25,
+                      help="Fraction of pages that are exact copies of an earlier page")
+    prep.add_argument("--dpi", type=int, default=300, help="Scan resolution")
+    prep.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                      help="Worker counts to compare")
+    prep.add_argument("--trials", type=int, default=3)
+
+    dedup = subparsers.add_parser("dedup-check", help="Check that distinct scanned pages are never dropped")
+    dedup.add_argument("--pages", type=int, default=6, help="Distinct pages of dense scanned text")
+    dedup.add_argument("--dpi", type=int, default=300, help="Scan resolution")
+
+    exp = subparsers.add_parser("export", help="Streaming history export timings")
+    exp.add_argument("--entries", type=int, default=100000, help="History entries to export")
+    exp.add_argument("--analysis-chars", type=int, default=4000)
+    exp.add_argument("--formats", nargs="+", default=["csv", "parquet", "pdf"], help="Formats to export")
+    exp.add_argument("--chunk-size", type=int, default=1000, help="Entries read and written per chunk")
+    exp.add_argument("--trials", type=int, default=1)
+    exp.add_argument("--trace-memory", action="store_true",
+                     help="Report peak Python memory (slower) and compare with loading the whole history")
+
+    outage = subparsers.add_parser("outage", help="Session start during a reference site outage")
+    outage.add_argument("--sessions", type=int, default=6)
+    outage.add_argument("--concurrency", type=int, default=2)
+    outage.add_argument("--retry-wait", type=float, default=0.5,
+                        help="Seconds between reference retries (the app default is 10)")
+
+    # Internal: one cold-start measurement, run in a fresh process by "coldstart"
+    trial = subparsers.add_parser("coldstart-trial")
+    trial.add_argument("--warm", action="store_true")
+    return parser
+
+
+COMMANDS = {
+    "hotpaths": run_hotpaths,
+    "load": run_load,
+    "coldstart": run_coldstart,
+    "coldstart-trial": run_coldstart_trial,
+    "preprocess": run_preprocess,
+    "dedup-check": run_dedup_check,
+    "export": run_export,
+    "outage": run_outage,
+}
+
+
+if __name__ == "__main__":
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    args = build_parser().parse_args()
+    results = COMMANDS[args.command](args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
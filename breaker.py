@@ -0,0 +1,257 @@
+"""
+Circuit breakers for ComplegalAI's external dependencies.
+
+Each dependency (a reference document URL, the Gemini Files API, the
+generate endpoint of each model) gets one breaker shared by every session in
+the process. After a run of consecutive failures the circuit opens and calls
+fail immediately with CircuitOpenError instead of waiting on a service that
+is down. Once the reset timeout has passed, a single call is let through as a
+probe: if it succeeds the circuit closes again, if it fails the circuit stays
+open for another timeout.
+
+Opened circuits are also recorded in the shared store, so other replicas
+(and processes started during an outage) skip a dependency another replica
+has just found down instead of discovering the outage themselves.
+
+Configuration (environment variables):
+    CIRCUIT_BREAKER_ENABLED    Set to 0 to never open circuits (default 1)
+    CIRCUIT_FAILURE_THRESHOLD  Consecutive failures that open a circuit (default 3)
+    CIRCUIT_RESET_TIMEOUT      Seconds an open circuit waits before probing (default 60)
+    CIRCUIT_SYNC_INTERVAL      Seconds between checks for circuits opened by other replicas (default 5)
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+import store
+
+ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "1") != "0"
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "60"))
+SYNC_INTERVAL = float(os.getenv("CIRCUIT_SYNC_INTERVAL", "5"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, label: str = None, retry_in: float = 0):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"{label or name} is unavailable; retrying in {max(0, round(retry_in))}s")
+
+
+def is_outage(error: Exception) -> bool:
+    """Return True for errors that suggest the dependency itself is down.
+
+    Errors with an HTTP status only count for 429s and 5xx; connection
+    failures, timeouts and bad payloads count too. Local file errors don't.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    if isinstance(error, OSError) and not isinstance(error, (ConnectionError, TimeoutError)):
+        return False
+    return True
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state for one dependency."""
+
+    def __init__(self, name: str, label: str = None, failure_threshold: int = FAILURE_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT):
+        self.name = name
+        self.label = label or name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.retry_at = None
+        self.last_error = None
+        self._probe_deadline = None
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        """Change state (with self._lock held) and count the transition."""
+        self.state = state
+        metrics.inc_counter("complegal_circuit_transitions_total", dependency=self.name, state=state)
+
+    def _sync(self, now: float):
+        """Adopt a circuit another replica has opened, checking the store every SYNC_INTERVAL."""
+        if self.state != CLOSED or now - self._last_sync < SYNC_INTERVAL:
+            return
+        self._last_sync = now
+        try:
+            shared = store.get_circuit(self.name)
+        except Exception:
+            # The breaker still works per process without the store
+            return
+        if shared is None or shared["retry_at"] <= now:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                self.opened_at = shared["opened_at"]
+                self.retry_at = shared["retry_at"]
+                self.last_error = shared["last_error"]
+                self._transition(OPEN)
+
+    def allow(self) -> bool:
+        """Return True if a call may go ahead; an open circuit lets one probe through after the timeout."""
+        if not ENABLED:
+            return True
+        now = time.time()
+        self._sync(now)
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            probing = self.state == HALF_OPEN and now < self._probe_deadline
+            if (self.state == OPEN and now < self.retry_at) or probing:
+                metrics.inc_counter("complegal_circuit_rejected_total", dependency=self.name)
+                return False
+            # Let this call through as the probe; a probe that never reports back is replaced after a timeout
+            self._probe_deadline = now + self.reset_timeout
+            self._transition(HALF_OPEN)
+            return True
+
+    def record_success(self):
+        """Record that the dependency answered, closing the circuit if it was open."""
+        with self._lock:
+            self.failures = 0
+            if self.state == CLOSED:
+                return
+            self._transition(CLOSED)
+            self.opened_at = self.retry_at = self._probe_deadline = None
+        try:
+            store.close_circuit(self.name)
+        except Exception:
+            pass
+
+    def record_failure(self, error: Exception = None):
+        """Record a failed call, opening the circuit after enough of them or when a probe fails."""
+        if not ENABLED:
+            return
+        now = time.time()
+        with self._lock:
+            self.failures += 1
+            if error is not None:
+                self.last_error = str(error)[:500]
+            if self.state == OPEN or (self.state == CLOSED and self.failures < self.failure_threshold):
+                return
+            self.opened_at = now
+            self.retry_at = now + self.reset_timeout
+            self._probe_deadline = None
+            self._transition(OPEN)
+        try:
+            store.open_circuit(self.name, self.opened_at, self.retry_at, self.last_error)
+        except Exception:
+            pass
+
+    def error(self) -> CircuitOpenError:
+        """Build the error raised for a call the circuit rejected."""
+        return CircuitOpenError(self.name, self.label, (self.retry_at or time.time()) - time.time())
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            state = self.state
+            if state == OPEN and now >= self.retry_at:
+                # The next call will probe
+                state = HALF_OPEN
+            return {
+                "label": self.label,
+                "state": state,
+                "failures": self.failures,
+                "retry_in": round(max(0.0, self.retry_at - now), 1) if self.retry_at else None,
+                "last_error": self.last_error,
+            }
+
+
+def get(name: str, label: str = None) -> CircuitBreaker:
+    """Return the process-wide breaker for a dependency, creating it on first use."""
+    with _lock:
+        circuit = _breakers.get(name)
+        if circuit is None:
+            circuit = _breakers[name] = CircuitBreaker(name, label)
+        elif label and circuit.label == name:
+            circuit.label = label
+        return circuit
+
+
+def is_open(*names: str) -> bool:
+    """Return True if any of the named circuits is open and not yet due for a probe."""
+    circuits = [get(name) for name in names]
+    now = time.time()
+    for circuit in circuits:
+        # Also notice circuits another replica has opened
+        circuit._sync(now)
+    return any(circuit.status()["state"] == OPEN for circuit in circuits)
+
+
+def wait(seconds: float, *names: str, step: float = 1.0) -> bool:
+    """Sleep between retries, waking early if any of the named circuits opens.
+
+    Returns False if a circuit opened, so the caller can give up instead of
+    sleeping through an outage another session has already detected.
+    """
+    deadline = time.time() + seconds
+    while True:
+        if is_open(*names):
+            return False
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return True
+        time.sleep(min(step, remaining))
+
+
+@contextmanager
+def guard(name: str, label: str = None, is_failure=is_outage):
+    """Run the block against a dependency, failing fast while its circuit is open.
+
+    Exceptions for which is_failure returns True count towards opening the
+    circuit; any other outcome means the dependency answered.
+    """
+    circuit = get(name, label)
+    if not circuit.allow():
+        raise circuit.error()
+    try:
+        yield circuit
+    except Exception as e:
+        if is_failure(e):
+            circuit.record_failure(e)
+        else:
+            circuit.record_success()
+        raise
+    circuit.record_success()
+
+
+def status() -> dict:
+    """Return the state of every dependency this process has called."""
+    with _lock:
+        breakers = list(_breakers.values())
+    return {circuit.name: circuit.status() for circuit in sorted(breakers, key=lambda c: c.name)}
+
+
+def health() -> dict:
+    """Return an overall status ("ok" or "degraded") with each dependency's state."""
+    dependencies = status()
+    healthy = all(dependency["state"] == CLOSED for dependency in dependencies.values())
+    return {"status": "ok" if healthy else "degraded", "dependencies": dependencies}
+
+
+def reset():
+    """Forget every breaker in this process."""
+    with _lock:
+        _breakers.clear()
@@ -10,7 +10,7 @@ import shutil
 import glob
 import argparse
 
-def cleanup(reset_env=False, reset_all=False):
+def cleanup(reset_env=False, reset_all=False, remote=False):
     """Clean up temporary files and optionally reset environment variables."""
     
     print("Cleaning up temporary files...")
@@ -25,6 +25,22 @@ def cleanup(reset_env=False, reset_all=False):
         print(f"Removing {temp_file}")
         os.remove(temp_file)
     
+    # Clean up orphaned Gemini files
+    if remote:
+        import janitor
+        from dotenv import load_dotenv
+        from warmup import get_api_key
+        
+        load_dotenv()
+        api_key = get_api_key()
+        if api_key:
+            from google import genai
+            result = janitor.sweep_remote(genai.Client(api_key=api_key))
+            print(f"Removed {result['orphaned_files'] + result['evicted_files']} Gemini files "
+                  f"({result['bytes']} bytes)")
+        else:
+            print("No Gemini API key found; skipping remote cleanup.")
+    
     # Clean up Streamlit cache
     streamlit_cache = os.path.join(os.path.expanduser("~"), ".streamlit/cache")
     if os.path.exists(streamlit_cache):
@@ -60,7 +76,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Clean up temporary files and reset application state.")
     parser.add_argument("--reset-env", action="store_true", help="Reset environment variables (.env file)")
     parser.add_argument("--reset-all", action="store_true", help="Reset everything (environment, virtual environment, etc.)")
+    parser.add_argument("--remote", action="store_true", help="Also delete Gemini files no live session is using")
     
     args = parser.parse_args()
     
-    cleanup(reset_env=args.reset_env, reset_all=args.reset_all)
+    cleanup(reset_env=args.reset_env, reset_all=args.reset_all, remote=args.remote)
@@ -0,0 +1,591 @@
+"""
+Golden-claim evaluation harness for ComplegalAI.
+
+Runs a directory of anonymized golden claims through one or more pipeline
+variants and compares them on rating accuracy, latency, tokens and cost. A
+variant can change the system instructions, the prompt, the model or routes,
+or whether PDFs are preprocessed; everything else follows the app's own
+pipeline (reports and reference documents sent on the context route, then
+the prompt on its route).
+
+Golden claims live one per directory (evals/claims/sample-lumbar is a
+synthetic example that runs against the fake backend):
+
+    evals/claims/<claim>/expected.json   {"rating_strings": [...], "total_pd_percent": 15,
+                                          "total_pd_amount": 16000.00}
+    evals/claims/<claim>/*.pdf           the claim's medical reports
+
+Variants are a JSON list in evals/variants.json, for example:
+
+    [{"name": "baseline"},
+     {"name": "flash-only", "model": "gemini-2.5-flash-preview-04-17"},
+     {"name": "short-instructions", "system_instructions_file": "evals/short.txt"},
+     {"name": "simple", "prompt": "Simple Analysis"}]
+
+Variant keys: system_instructions / system_instructions_file, prompt (a
+predefined prompt name) / prompt_text, model (one model for every route),
+routes (overrides for router.ROUTES), context_route, prompt_route,
+preprocess, prices ({model: [input, output] USD per million tokens}).
+
+Usage:
+    python evaluate.py --backend live --record   # call Gemini and record every response
+    python evaluate.py                           # replay the recorded responses offline
+    python evaluate.py --backend fake            # exercise the harness (and the sample claim) against fake_gemini
+    python evaluate.py --concurrency 8 --output eval_results.json
+
+Results are cached per claim and variant in their own file
+(evals/results_cache.json), so re-running after changing one variant only
+runs that variant; use --no-cache to force every case to run again.
+"""
+
+import argparse
+import contextvars
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep evaluation spans apart from the app's
+os.environ.setdefault("METRICS_LOG_PATH", os.path.join("logs", "eval_spans.jsonl"))
+# Replays must make the same calls on every run, so never skip a model because its circuit opened
+os.environ.setdefault("CIRCUIT_BREAKER_ENABLED", "0")
+
+import export
+import preprocess
+import prompts
+import references
+import router
+import store
+
+CLAIMS_DIR = os.getenv("EVAL_CLAIMS_DIR", os.path.join("evals", "claims"))
+VARIANTS_PATH = os.getenv("EVAL_VARIANTS_PATH", os.path.join("evals", "variants.json"))
+RECORDINGS_PATH = os.getenv("EVAL_RECORDINGS_PATH", os.path.join("evals", "recordings.json"))
+RESULTS_CACHE_PATH = os.getenv("EVAL_RESULTS_CACHE_PATH", os.path.join("evals", "results_cache.json"))
+
+# Prompt scored by default; it asks for the full rating
+DEFAULT_PROMPT = "Rating Analysis"
+
+# Paid-tier list prices in USD per million tokens (input, output); override per variant with "prices"
+PRICES = {
+    router.PRO_MODEL: (1.25, 10.00),
+    router.FLASH_MODEL: (0.15, 0.60),
+    router.FALLBACK_MODEL: (0.10, 0.40),
+}
+
+# A PD amount within this fraction of the expected amount counts as correct
+AMOUNT_TOLERANCE = 0.01
+
+BACKENDS = ("replay", "live", "fake")
+
+# State of the case running on the current thread: claim, usage and conversation so far
+_case = contextvars.ContextVar("eval_case")
+_recordings_lock = threading.Lock()
+_results_cache_lock = threading.Lock()
+
+
+def load_claims(directory: str = CLAIMS_DIR) -> list:
+    """Return the golden claims in a directory, sorted by name."""
+    claims = []
+    for name in sorted(os.listdir(directory)):
+        claim_dir = os.path.join(directory, name)
+        expected_path = os.path.join(claim_dir, "expected.json")
+        if not os.path.isfile(expected_path):
+            continue
+        with open(expected_path, "r") as f:
+            expected = json.load(f)
+        files = sorted(os.path.join(claim_dir, f) for f in os.listdir(claim_dir) if f.lower().endswith(".pdf"))
+        if not files:
+            print(f"Skipping golden claim {name}: no PDF reports")
+            continue
+        claims.append({"id": name, "files": files, "expected": expected})
+    return claims
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
+
+def resolve_variant(variant: dict) -> dict:
+    """Fill in a variant's defaults so it fully describes what is sent."""
+    prompt_name = variant.get("prompt", DEFAULT_PROMPT)
+    routes = {name: dict(route) for name, route in router.ROUTES.items()}
+    for name, overrides in variant.get("routes", {}).items():
+        routes[name] = {**routes.get(name, {}), **overrides}
+    if variant.get("model"):
+        # One model for everything: no fallbacks or escalation
+        routes = {name: {**route, "models": [variant["model"]], "escalate_to": None} for name, route in routes.items()}
+
+    default_route, validator = router.route_for_prompt(prompt_name)
+    if "system_instructions_file" in variant:
+        system_instructions = _read_text(variant["system_instructions_file"])
+    else:
+        system_instructions = variant.get("system_instructions", prompts.SYSTEM_INSTRUCTIONS)
+    return {
+        "name": variant["name"],
+        "system_instructions": system_instructions,
+        "prompt_text": variant.get("prompt_text") or prompts.PREDEFINED_PROMPTS[prompt_name],
+        "routes": routes,
+        "context_route": variant.get("context_route", router.CONTEXT_ROUTE),
+        "prompt_route": variant.get("prompt_route", default_route),
+        "validator": validator,
+        "preprocess": variant.get("preprocess", preprocess.ENABLED),
+        "prices": {**{model: list(price) for model, price in PRICES.items()}, **variant.get("prices", {})},
+    }
+
+
+def load_variants(path: str = VARIANTS_PATH, names: list = None) -> list:
+    """Load and resolve the variants to compare (just the app's defaults if there is no file)."""
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            variants = json.load(f)
+    else:
+        variants = [{"name": "baseline"}]
+    if names:
+        variants = [v for v in variants if v["name"] in names]
+    return [resolve_variant(v) for v in variants]
+
+
+# Clients: every call goes through _EvalClient, which meters tokens and records or replays responses
+
+def _part_digest(part) -> str:
+    if isinstance(part, str):
+        return "text:" + part
+    # Uploaded files are identified by the display name set when they were uploaded
+    return "file:" + str(getattr(part, "display_name", None) or getattr(part, "name", part))
+
+
+def _message_key(model: str, message, case: dict) -> str:
+    """Key a call by model, claim, the conversation so far and the message itself."""
+    parts = message if isinstance(message, list) else [message]
+    digest = hashlib.sha256()
+    for piece in [model, case["claim"], case["conversation"]] + [_part_digest(part) for part in parts]:
+        digest.update(piece.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _response(text: str, usage: dict):
+    from google.genai import types
+
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=usage.get("input", 0),
+            candidates_token_count=usage.get("output", 0),
+            total_token_count=usage.get("input", 0) + usage.get("output", 0),
+        ),
+    )
+
+
+def _recorded_error(entry: dict) -> Exception:
+    """Rebuild a recorded failure so the router falls back exactly as it did when recorded."""
+    from google.genai import errors
+
+    code = entry["error_code"]
+    if code is None:
+        return TimeoutError(entry["error"])
+    body = {"error": {"code": code, "message": entry["error"], "status": entry.get("error_status")}}
+    return errors.ServerError(code, body) if code >= 500 else errors.ClientError(code, body)
+
+
+class _EvalChat:
+    """Wraps a chat session to meter tokens and record or replay responses."""
+
+    def __init__(self, owner, chat, model: str):
+        self._owner = owner
+        self._chat = chat
+        self.model = model
+
+    def get_history(self, curated: bool = False):
+        return self._chat.get_history(curated=curated)
+
+    def send_message(self, message, config=None):
+        case = _case.get()
+        key = _message_key(self.model, message, case)
+        seen = case["seen"].get(key, 0)
+        case["seen"][key] = seen + 1
+
+        if self._owner.replay:
+            entries = self._owner.recordings.get(key)
+            if not entries:
+                raise LookupError(f"No recorded response for claim {case['claim']} on {self.model}; "
+                                  "record one with --backend live --record")
+            entry = entries[min(seen, len(entries) - 1)]
+            if entry.get("latency") and self._owner.latency_scale:
+                time.sleep(entry["latency"] * self._owner.latency_scale)
+            if "error" in entry:
+                raise _recorded_error(entry)
+            response = _response(entry["text"], entry["usage"])
+        else:
+            start = time.perf_counter()
+            try:
+                response = self._chat.send_message(message, config=config)
+            except Exception as e:
+                # Only failures the router falls back from matter for replay; others end the case
+                if router.is_retryable(e):
+                    self._owner.record(key, {"claim": case["claim"], "model": self.model, "error": str(e),
+                                             "error_code": getattr(e, "code", None),
+                                             "error_status": getattr(e, "status", None),
+                                             "latency": time.perf_counter() - start})
+                raise
+            usage = response.usage_metadata
+            self._owner.record(key, {
+                "claim": case["claim"], "model": self.model, "text": response.text,
+                "usage": {"input": getattr(usage, "prompt_token_count", 0) or 0,
+                          "output": getattr(usage, "candidates_token_count", 0) or 0},
+                "latency": time.perf_counter() - start,
+            })
+
+        usage = response.usage_metadata
+        totals = case["usage"].setdefault(self.model, {"input": 0, "output": 0})
+        totals["input"] += getattr(usage, "prompt_token_count", 0) or 0
+        totals["output"] += getattr(usage, "candidates_token_count", 0) or 0
+        case["conversation"] = hashlib.sha256((case["conversation"] + key).encode()).hexdigest()
+        return response
+
+
+class _EvalChats:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, *, model, config=None, history=None):
+        chat = self._owner.client.chats.create(model=model, config=config, history=history)
+        return _EvalChat(self._owner, chat, model)
+
+
+class _EvalClient:
+    """Client wrapper used for every case; files go straight to the wrapped client."""
+
+    def __init__(self, client, recordings: dict = None, replay: bool = False, latency_scale: float = 1.0,
+                 cache_tag: str = ""):
+        self.client = client
+        # references.py keys shared uploads by the wrapped client's API key
+        self._api_client = getattr(client, "_api_client", None)
+        self.files = client.files
+        self.chats = _EvalChats(self)
+        self.recordings = recordings
+        self.replay = replay
+        self.latency_scale = latency_scale
+        # Part of every result cache key, so cached results never cross backends or recordings
+        self.cache_tag = cache_tag
+
+    def record(self, key: str, entry: dict):
+        if self.recordings is None or self.replay:
+            return
+        with _recordings_lock:
+            self.recordings.setdefault(key, []).append(entry)
+
+
+def make_client(backend: str, recordings: dict = None, record: bool = False, latency_scale: float = 1.0,
+                fake_latency: float = 0.0):
+    """Create the wrapped client for a backend."""
+    if backend == "live":
+        from dotenv import load_dotenv
+        from google import genai
+
+        from warmup import get_api_key
+
+        load_dotenv()
+        api_key = get_api_key()
+        if not api_key:
+            raise SystemExit("No Gemini API key found; set GEMINI_API_KEY or use --backend replay")
+        client = genai.Client(api_key=api_key)
+        cache_tag = "live"
+    else:
+        from fake_gemini import FakeClient, FakeGeminiBackend
+
+        client = FakeClient(FakeGeminiBackend(latency=fake_latency))
+        cache_tag = f"fake:{fake_latency}"
+    if backend == "replay":
+        digest = hashlib.sha256(json.dumps(recordings or {}, sort_keys=True).encode()).hexdigest()
+        cache_tag = f"replay:{latency_scale}:{digest}"
+    return _EvalClient(client, recordings if (record or backend == "replay") else None,
+                       replay=backend == "replay", latency_scale=latency_scale, cache_tag=cache_tag)
+
+
+# Running cases
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _reference_files(client: _EvalClient, offline: bool) -> list:
+    """Return the reference documents to send with every claim."""
+    if not offline:
+        return [references.get_reference_file(client, key) for key in references.REFERENCE_DOCUMENTS]
+    # Replayed and fake runs never read the documents, so don't download them
+    return [client.files.upload(file=io.BytesIO(b"%PDF-1.4\n"), config={"display_name": f"reference-{key}.pdf",
+                                                                        "mime_type": "application/pdf"})
+            for key in references.REFERENCE_DOCUMENTS]
+
+
+def _claim_files(claim: dict, use_preprocess: bool) -> list:
+    """Return the PDFs to upload for a claim, preprocessing them at most once per run."""
+    if not use_preprocess:
+        return claim["files"]
+    with claim["lock"]:
+        if claim.get("preprocessed_files") is None:
+            out_paths = [os.path.join(claim["workdir"], os.path.basename(path)) for path in claim["files"]]
+            result = preprocess.preprocess_claim(claim["files"], out_paths)
+            claim["preprocessed_files"] = [path for path in result["paths"] if path]
+        return claim["preprocessed_files"]
+
+
+def _run_pipeline(client: _EvalClient, claim: dict, files: list, variant: dict, offline: bool) -> str:
+    """Send a claim's files through the app's pipeline and return the scored response text."""
+    uploaded = []
+    try:
+        for path in files:
+            # Name uploads by content so recordings follow the exact bytes sent
+            display_name = f"{os.path.basename(path)}#{_file_digest(path)}"
+            uploaded.append(client.files.upload(file=path, config={"display_name": display_name,
+                                                                   "mime_type": "application/pdf"}))
+            if not offline:
+                # Lets the janitor clean up after a run that dies before the deletes below
+                store.record_uploads([uploaded[-1].name])
+
+        contents = [variant["system_instructions"]] + uploaded + _reference_files(client, offline)
+        chat, model, _ = router.send_message(client, None, None, contents, route=variant["context_route"],
+                                             claim_id=claim["id"], routes=variant["routes"])
+        chat, model, response = router.send_message(client, chat, model, variant["prompt_text"],
+                                                    route=variant["prompt_route"], validator=variant["validator"],
+                                                    claim_id=claim["id"], routes=variant["routes"])
+        return response.text
+    finally:
+        if not offline:
+            for file in uploaded:
+                try:
+                    client.files.delete(name=file.name)
+                except Exception:
+                    pass
+
+
+def _cache_key(claim: dict, variant: dict, cache_tag: str) -> str:
+    config = {key: value for key, value in variant.items() if key not in ("name", "prices")}
+    files = [_file_digest(path) for path in claim["files"]]
+    payload = json.dumps([cache_tag, config, files], sort_keys=True)
+    return "eval:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_case(client: _EvalClient, claim: dict, variant: dict, backend: str, results_cache: dict,
+             use_cache: bool = True) -> dict:
+    """Run one claim through one variant (or reuse the cached run) and score it."""
+    cache_key = _cache_key(claim, variant, client.cache_tag)
+    with _results_cache_lock:
+        outcome = results_cache.get(cache_key) if use_cache else None
+    cached = outcome is not None
+    if not cached:
+        case = {"claim": claim["id"], "usage": {}, "conversation": "", "seen": {}}
+        token = _case.set(case)
+        start = time.perf_counter()
+        try:
+            # Preprocessing is local and shared by every variant, so it isn't part of the case latency
+            files = _claim_files(claim, variant["preprocess"])
+            start = time.perf_counter()
+            text, error = _run_pipeline(client, claim, files, variant, offline=backend != "live"), None
+        except Exception as e:
+            text, error = None, f"{type(e).__name__}: {str(e)}"
+        finally:
+            _case.reset(token)
+        outcome = {"text": text, "error": error, "latency": time.perf_counter() - start, "usage": case["usage"]}
+        if error is None:
+            with _results_cache_lock:
+                results_cache[cache_key] = outcome
+
+    parsed = export.parse_rating_fields(outcome["text"])
+    return {
+        "variant": variant["name"],
+        "claim": claim["id"],
+        "cached": cached,
+        "error": outcome["error"],
+        "latency": outcome["latency"],
+        "usage": outcome["usage"],
+        "cost": cost(outcome["usage"], variant["prices"]),
+        "parsed": parsed,
+        "scores": score(parsed, claim["expected"]),
+    }
+
+
+# Scoring and reporting
+
+def _normalize_rating(rating: str) -> str:
+    return "".join(rating.split())
+
+
+def score(parsed: dict, expected: dict) -> dict:
+    """Compare parsed rating fields with a golden claim's expected values."""
+    expected_ratings = {_normalize_rating(r) for r in expected.get("rating_strings", [])}
+    found_ratings = {_normalize_rating(r) for r in parsed["rating_strings"]}
+    matched = len(expected_ratings & found_ratings)
+    scores = {
+        "ratings_recall": matched / len(expected_ratings) if expected_ratings else None,
+        "ratings_precision": matched / len(found_ratings) if found_ratings else (0.0 if expected_ratings else None),
+        "pd_percent_correct": None,
+        "pd_amount_correct": None,
+    }
+    if expected.get("total_pd_percent") is not None:
+        scores["pd_percent_correct"] = parsed["total_pd_percent"] == expected["total_pd_percent"]
+    if expected.get("total_pd_amount") is not None:
+        amount = parsed["total_pd_amount"]
+        tolerance = max(1.0, abs(expected["total_pd_amount"]) * AMOUNT_TOLERANCE)
+        scores["pd_amount_correct"] = amount is not None and abs(amount - expected["total_pd_amount"]) <= tolerance
+    checks = [expected_ratings == found_ratings] if expected_ratings else []
+    checks += [value for key, value in scores.items() if key.endswith("_correct") and value is not None]
+    scores["correct"] = bool(checks) and all(checks)
+    return scores
+
+
+def cost(usage: dict, prices: dict) -> float:
+    """Estimate the cost in USD of a case's token usage."""
+    total = 0.0
+    for model, tokens in usage.items():
+        input_price, output_price = prices.get(model, (0.0, 0.0))
+        total += tokens["input"] / 1e6 * input_price + tokens["output"] / 1e6 * output_price
+    return total
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def summarize(results: list) -> dict:
+    """Aggregate case results per variant."""
+    summary = {}
+    for name in dict.fromkeys(r["variant"] for r in results):
+        cases = [r for r in results if r["variant"] == name]
+        ok = [r for r in cases if r["error"] is None]
+        latencies = [r["latency"] for r in ok]
+        summary[name] = {
+            "cases": len(cases),
+            "errors": len(cases) - len(ok),
+            "cached": sum(r["cached"] for r in cases),
+            "accuracy": _mean([float(r["scores"]["correct"]) for r in cases]),
+            "ratings_recall": _mean([r["scores"]["ratings_recall"] for r in ok]),
+            "ratings_precision": _mean([r["scores"]["ratings_precision"] for r in ok]),
+            "pd_percent_accuracy": _mean([r["scores"]["pd_percent_correct"] for r in ok]),
+            "pd_amount_accuracy": _mean([r["scores"]["pd_amount_correct"] for r in ok]),
+            "p50_latency_s": _percentile(latencies, 50) if latencies else None,
+            "p95_latency_s": _percentile(latencies, 95) if latencies else None,
+            "input_tokens": sum(t["input"] for r in cases for t in r["usage"].values()),
+            "output_tokens": sum(t["output"] for r in cases for t in r["usage"].values()),
+            "cost_usd": sum(r["cost"] for r in cases),
+        }
+    return summary
+
+
+def _format(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(summary: dict):
+    """Print the per-variant comparison table."""
+    print(f"{'variant':<22}{'cases':>6}{'errors':>7}{'accuracy':>10}{'recall':>8}{'PD %':>7}{'PD $':>7}"
+          f"{'p50 s':>8}{'p95 s':>8}{'in tok':>11}{'out tok':>10}{'cost $':>9}")
+    for name, row in summary.items():
+        print(f"{name:<22}{row['cases']:>6}{row['errors']:>7}{_format(row['accuracy'], '.0%'):>10}"
+              f"{_format(row['ratings_recall'], '.0%'):>8}{_format(row['pd_percent_accuracy'], '.0%'):>7}"
+              f"{_format(row['pd_amount_accuracy'], '.0%'):>7}{_format(row['p50_latency_s'], '.1f'):>8}"
+              f"{_format(row['p95_latency_s'], '.1f'):>8}{row['input_tokens']:>11,}{row['output_tokens']:>10,}"
+              f"{row['cost_usd']:>9.4f}")
+
+
+def evaluate(claims: list, variants: list, client: _EvalClient, backend: str, concurrency: int = 4,
+             use_cache: bool = True, results_cache: dict = None) -> list:
+    """Run every claim through every variant, concurrency cases at a time.
+
+    Each claim is preprocessed at most once per run, the first time a
+    variant that preprocesses needs it. Finished cases are added to
+    results_cache, keyed by claim, variant and backend.
+    """
+    if results_cache is None:
+        results_cache = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for index, claim in enumerate(claims):
+            claim["workdir"] = os.path.join(workdir, str(index))
+            os.makedirs(claim["workdir"])
+            claim["lock"] = threading.Lock()
+            claim["preprocessed_files"] = None
+
+        cases = [(claim, variant) for variant in variants for claim in claims]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = [pool.submit(run_case, client, claim, variant, backend, results_cache, use_cache)
+                       for claim, variant in cases]
+            return [future.result() for future in futures]
+
+
+def _load_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_json(path: str, data: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate pipeline variants on golden claims.")
+    parser.add_argument("--claims", default=CLAIMS_DIR, help="Directory of golden claims")
+    parser.add_argument("--variants", default=VARIANTS_PATH, help="JSON file listing the variants")
+    parser.add_argument("--only", nargs="+", help="Only run these variants")
+    parser.add_argument("--backend", choices=BACKENDS, default="replay",
+                        help="replay recorded responses (default), call Gemini, or use the fake backend")
+    parser.add_argument("--record", action="store_true", help="Save live or fake responses for later replay")
+    parser.add_argument("--recordings", default=RECORDINGS_PATH, help="Recorded responses file")
+    parser.add_argument("--results-cache", default=RESULTS_CACHE_PATH, help="Cached case results file")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Replay recorded latencies scaled by this factor (0 replays instantly)")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="Latency per call for the fake backend")
+    parser.add_argument("--concurrency", type=int, default=4, help="Cases run at the same time")
+    parser.add_argument("--no-cache", action="store_true", help="Run every case even if a cached result exists")
+    parser.add_argument("--output", help="Write the per-case results and summary as JSON to this file")
+    args = parser.parse_args()
+
+    claims = load_claims(args.claims)
+    variants = load_variants(args.variants, args.only)
+    if not claims or not variants:
+        raise SystemExit(f"Nothing to evaluate: {len(claims)} golden claims, {len(variants)} variants")
+
+    recordings = _load_json(args.recordings)
+    results_cache = _load_json(args.results_cache)
+    client = make_client(args.backend, recordings, args.record, args.latency_scale, args.fake_latency)
+    started = time.perf_counter()
+    results = evaluate(claims, variants, client, args.backend, args.concurrency, not args.no_cache, results_cache)
+    _save_json(args.results_cache, results_cache)
+    if args.record and args.backend != "replay":
+        _save_json(args.recordings, recordings)
+
+    print(f"Evaluated {len(claims)} golden claims x {len(variants)} variants in "
+          f"{time.perf_counter() - started:.1f}s ({args.backend} backend)\n")
+    summary = summarize(results)
+    print_report(summary)
+    for result in results:
+        if result["error"]:
+            print(f"\n{result['variant']} / {result['claim']}: {result['error']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
@@ -0,0 +1,331 @@
+"""
+Bulk export of ComplegalAI report history.
+
+Streams history entries from the shared store to CSV, Parquet or a single
+combined PDF for billing and audit. Entries are read from the database in
+chunks and each chunk is written out before the next one is read, so memory
+use stays flat however large the history grows. Rating strings, the combined
+value and the total PD are parsed out of each analysis into their own columns
+when present.
+
+Usage:
+    python export.py history.csv
+    python export.py history.parquet --start 2025-01-01 --end 2025-03-31
+    python export.py claim.pdf --claim-id 3f2a9c1e7b40
+    python export.py history.csv --report smith_qme.pdf
+
+Parquet export needs pyarrow (pip install pyarrow). CSV and PDF export have
+no extra dependencies.
+"""
+
+import argparse
+import csv
+import os
+import re
+import time
+import zlib
+from array import array
+
+import store
+
+FORMATS = ("csv", "parquet", "pdf")
+
+# Entries read from the database and written out per chunk
+CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+FIELDS = ["id", "timestamp", "claim_id", "reports", "prompt", "analysis",
+          "rating_strings", "combined_value", "total_pd_percent", "total_pd_amount"]
+
+# e.g. 15.03.01.00 - 8 - [1.4]11 - 470H - 13 - 15%
+RATING_STRING = re.compile(
+    r"\b\d{2}\.\d{2}\.\d{2}\.\d{2}\s*-\s*\d+\s*-\s*\[\s*[\d.]+\s*\]\s*\d+\s*-\s*\d{3}[A-J]\s*-\s*\d+\s*-\s*\d+\s*%"
+)
+COMBINED_VALUE = re.compile(r"combined(?:\s+(?:value|rating))?\b[^\d\n]{0,20}?(\d{1,3})\s*%", re.IGNORECASE)
+TOTAL_PD = re.compile(
+    r"total\s+(?:PD|permanent\s+disability)\b[^\d\n]{0,20}?(\d{1,3})\s*%(?:[^$\n]{0,20}?\$\s?([\d,]+(?:\.\d{2})?))?",
+    re.IGNORECASE,
+)
+
+
+def parse_rating_fields(analysis: str) -> dict:
+    """Pull rating strings, the combined value and the total PD out of an analysis."""
+    fields = {"rating_strings": [], "combined_value": None, "total_pd_percent": None, "total_pd_amount": None}
+    if not analysis:
+        return fields
+    fields["rating_strings"] = [re.sub(r"\s+", " ", match) for match in RATING_STRING.findall(analysis)]
+    # The last figures given are the final ones when an analysis walks through its working
+    combined = COMBINED_VALUE.findall(analysis)
+    if combined:
+        fields["combined_value"] = int(combined[-1])
+    total = TOTAL_PD.findall(analysis)
+    if total:
+        percent, amount = total[-1]
+        fields["total_pd_percent"] = int(percent)
+        if amount:
+            fields["total_pd_amount"] = float(amount.replace(",", ""))
+    return fields
+
+
+def iter_rows(start: str = None, end: str = None, claim_id: str = None, report: str = None,
+              chunk_size: int = CHUNK_SIZE):
+    """Yield flattened export rows for the matching history entries, oldest first."""
+    for entry in store.iter_history(start, end, batch_size=chunk_size, claim_id=claim_id, report=report):
+        row = {
+            "id": entry.get("id"),
+            "timestamp": entry["timestamp"],
+            "claim_id": entry.get("claim_id"),
+            "reports": entry.get("reports", []),
+            "prompt": entry.get("prompt"),
+            "analysis": entry.get("analysis"),
+        }
+        row.update(parse_rating_fields(entry.get("analysis")))
+        yield row
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(rows, f, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write rows to a text file as CSV, one chunk at a time; returns the row count."""
+    writer = csv.DictWriter(f, fieldnames=FIELDS)
+    writer.writeheader()
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows({**row, "reports": "; ".join(row["reports"]),
+                          "rating_strings": "; ".join(row["rating_strings"])} for row in chunk)
+        f.flush()
+        count += len(chunk)
+    return count
+
+
+def parquet_available() -> bool:
+    """Return True if pyarrow is installed for Parquet export."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.string()),
+        ("claim_id", pa.string()),
+        ("reports", pa.list_(pa.string())),
+        ("prompt", pa.string()),
+        ("analysis", pa.string()),
+        ("rating_strings", pa.list_(pa.string())),
+        ("combined_value", pa.int32()),
+        ("total_pd_percent", pa.int32()),
+        ("total_pd_amount", pa.float64()),
+    ])
+
+
+def write_parquet(rows, f, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write rows to a binary file as Parquet, one row group per chunk; returns the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = _parquet_schema()
+    count = 0
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        for chunk in _chunks(rows, chunk_size):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+        if count == 0:
+            # Still produce a readable file with the schema
+            writer.write_table(schema.empty_table())
+    return count
+
+
+class _PdfWriter:
+    """Minimal PDF writer that streams pages of monospaced text straight to a file.
+
+    Only the byte offset of each object and the ID of each page are kept in
+    memory (a few bytes per page), so documents of any length can be written
+    without holding their pages.
+    """
+
+    PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, in points
+    MARGIN = 54
+    FONT_SIZE = 9
+    LEADING = 11
+    # Courier glyphs are 0.6 em wide, so line capacity is exact
+    LINE_CHARS = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+    PAGE_LINES = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+
+    # Objects 1-3 are written last but numbered first
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self, f):
+        self.f = f
+        # Indexed by object ID; 0 is the free-list head
+        self.offsets = array("Q", [0] * 4)
+        self.next_id = 4
+        self.page_ids = array("L")
+        self.lines = []
+        self._position = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes):
+        self.f.write(data)
+        self._position += len(data)
+
+    def _object(self, object_id: int, body: bytes):
+        self.offsets[object_id] = self._position
+        self._write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+
+    def _allocate(self) -> int:
+        object_id = self.next_id
+        self.next_id += 1
+        self.offsets.append(0)
+        return object_id
+
+    def add_lines(self, text: str = ""):
+        """Queue text, wrapping it to the page width and flushing full pages."""
+        for paragraph in (text or "").splitlines() or [""]:
+            paragraph = paragraph.expandtabs(4).rstrip()
+            while len(paragraph) > self.LINE_CHARS:
+                cut = paragraph.rfind(" ", 0, self.LINE_CHARS + 1)
+                if cut <= 0:
+                    cut = self.LINE_CHARS
+                self.lines.append(paragraph[:cut])
+                paragraph = paragraph[cut:].lstrip()
+            self.lines.append(paragraph)
+            while len(self.lines) >= self.PAGE_LINES:
+                self._flush_page(self.lines[:self.PAGE_LINES])
+                self.lines = self.lines[self.PAGE_LINES:]
+
+    def new_page(self):
+        if self.lines:
+            self._flush_page(self.lines)
+            self.lines = []
+
+    @staticmethod
+    def _escape(line: str) -> bytes:
+        # Match the font's WinAnsiEncoding so smart quotes, dashes and bullets survive
+        data = line.encode("cp1252", "replace")
+        return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    def _flush_page(self, lines):
+        content = [b"BT /F1 %d Tf %d TL %d %d Td" % (self.FONT_SIZE, self.LEADING, self.MARGIN,
+                                                   self.PAGE_HEIGHT - self.MARGIN - self.FONT_SIZE)]
+        content.extend(b"(" + self._escape(line) + b") Tj T*" for line in lines)
+        content.append(b"ET")
+        stream = zlib.compress(b"\n".join(content))
+
+        content_id, page_id = self._allocate(), self._allocate()
+        self._object(content_id, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream +
+                     b"\nendstream")
+        self._object(page_id, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+                              b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                     % (self.PAGES, self.PAGE_WIDTH, self.PAGE_HEIGHT, self.FONT, content_id))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        self.new_page()
+        if not self.page_ids:
+            self._flush_page(["No history entries matched."])
+        self._object(self.FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier "
+                                b"/Encoding /WinAnsiEncoding >>")
+        self.offsets[self.PAGES] = self._position
+        self._write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (self.PAGES, len(self.page_ids)))
+        for start in range(0, len(self.page_ids), 1000):
+            self._write(b"".join(b"%d 0 R " % page_id for page_id in self.page_ids[start:start + 1000]))
+        self._write(b"] >>\nendobj\n")
+        self._object(self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES)
+
+        xref_offset = self._position
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id)
+        for start in range(1, self.next_id, 1000):
+            end = min(self.next_id, start + 1000)
+            self._write(b"".join(b"%010d 00000 n \n" % offset for offset in self.offsets[start:end]))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (self.next_id, self.CATALOG, xref_offset))
+
+
+def write_pdf(rows, f, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write rows to a binary file as one combined PDF, one entry per page; returns the row count."""
+    pdf = _PdfWriter(f)
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        for row in chunk:
+            pdf.add_lines(f"Analysis #{row['id']}    {row['timestamp']}")
+            if row["claim_id"]:
+                pdf.add_lines(f"Claim: {row['claim_id']}")
+            pdf.add_lines(f"Reports: {', '.join(row['reports']) or 'N/A'}")
+            pdf.add_lines(f"Prompt: {row['prompt'] or 'N/A'}")
+            if row["rating_strings"]:
+                pdf.add_lines("Rating strings: " + "; ".join(row["rating_strings"]))
+            if row["total_pd_percent"] is not None:
+                amount = f" (${row['total_pd_amount']:,.2f})" if row["total_pd_amount"] is not None else ""
+                pdf.add_lines(f"Total PD: {row['total_pd_percent']}%{amount}")
+            pdf.add_lines("")
+            pdf.add_lines(row["analysis"] or "")
+            pdf.new_page()
+        f.flush()
+        count += len(chunk)
+    pdf.close()
+    return count
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "pdf": write_pdf}
+
+
+def export_history(path: str, format: str = None, start: str = None, end: str = None, claim_id: str = None,
+                   report: str = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """Export the matching history entries to a file; returns the number exported.
+
+    The format defaults to the file extension. The file is written under a
+    temporary name and renamed when complete, so readers never see a partial
+    export.
+    """
+    format = (format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if format not in WRITERS:
+        raise ValueError(f"Unknown export format: {format} (expected one of {', '.join(FORMATS)})")
+
+    rows = iter_rows(start, end, claim_id, report, chunk_size)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if format == "csv":
+            with open(temp_path, "w", newline="", encoding="utf-8") as f:
+                count = write_csv(rows, f, chunk_size)
+        else:
+            with open(temp_path, "wb") as f:
+                count = WRITERS[format](rows, f, chunk_size)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export report history to CSV, Parquet or a combined PDF.")
+    parser.add_argument("output", help="File to write; the extension picks the format unless --format is given")
+    parser.add_argument("--format", choices=FORMATS, help="Output format")
+    parser.add_argument("--start", help="Only entries on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Only entries on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--claim-id", help="Only entries for this claim")
+    parser.add_argument("--report", help="Only entries whose report file names contain this text")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Entries read and written per chunk")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    exported = export_history(args.output, args.format, args.start, args.end, args.claim_id, args.report,
+                              args.chunk_size)
+    print(f"Exported {exported:,} entries to {args.output} in {time.perf_counter() - started:.1f}s")
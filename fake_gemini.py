@@ -0,0 +1,322 @@
+"""
+Offline stand-in for the Gemini client used by ComplegalAI.
+
+FakeGeminiBackend plays the role of the remote service: it keeps the uploaded
+files, simulates latency, token streaming, 429/5xx errors and file expiry, and
+counts the tokens it has "processed". FakeClient mirrors the parts of
+google.genai.Client the app uses (client.files and client.chats), so it can be
+dropped into st.session_state.client for benchmarks and load tests without
+network access.
+
+Responses and errors are built from the real google.genai types so the app
+code sees exactly the same objects it would get from the API.
+"""
+
+import io
+import itertools
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from google.genai import errors, types
+
+# The Files API keeps uploads for 48 hours
+DEFAULT_FILE_TTL = 48 * 60 * 60
+
+DEFAULT_RESPONSE = (
+    "15.03.01.00 - 8 - [1.4]11 - 470H - 13 - 15%\n"
+    "Combined value: 15%\n"
+    "Total PD: 15% ($16,000.00)"
+)
+
+
+class FakeGeminiBackend:
+    """Simulated Gemini service shared by any number of FakeClient instances."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        upload_latency: float = None,
+        tokens_per_second: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        file_ttl: float = DEFAULT_FILE_TTL,
+        response_text: str = DEFAULT_RESPONSE,
+        tokens_per_file_kb: float = 0.25,
+        model_responses: dict = None,
+        failing_models=(),
+        seed: int = None,
+    ):
+        """
+        Args:
+            latency: Base latency in seconds for every call.
+            jitter: Extra random latency (uniform 0..jitter) added to every call.
+            upload_latency: Base latency for file uploads (defaults to latency).
+            tokens_per_second: Output streaming speed; 0 returns responses instantly.
+            rate_limit_rate: Probability (0-1) that a call fails with a 429.
+            server_error_rate: Probability (0-1) that a call fails with a 503.
+            file_ttl: Seconds before an uploaded file expires.
+            response_text: Text returned by every chat message.
+            tokens_per_file_kb: Prompt tokens charged per KB of an attached file.
+            model_responses: Per-model response text, overriding response_text.
+            failing_models: Models that always fail with a 503 (to exercise fallbacks).
+            seed: Seed for the random number generator, for reproducible runs.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.upload_latency = latency if upload_latency is None else upload_latency
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.file_ttl = file_ttl
+        self.response_text = response_text
+        self.tokens_per_file_kb = tokens_per_file_kb
+        self.model_responses = dict(model_responses or {})
+        self.failing_models = set(failing_models)
+        self.files = {}
+        self.calls = {}
+        self.tokens = {"input": 0, "output": 0}
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sleep(self, base: float):
+        """Simulate network and processing latency."""
+        with self._lock:
+            delay = base + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _maybe_fail(self, operation: str, model: str = None):
+        """Count a call and raise an injected error if one is due."""
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            roll = self._random.random()
+        if roll < self.rate_limit_rate and model not in self.failing_models:
+            raise errors.ClientError(429, {"error": {
+                "code": 429,
+                "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED",
+            }})
+        if model in self.failing_models or roll < self.rate_limit_rate + self.server_error_rate:
+            raise errors.ServerError(503, {"error": {
+                "code": 503,
+                "message": "The model is overloaded. Please try again later.",
+                "status": "UNAVAILABLE",
+            }})
+
+    def _not_found(self, name: str):
+        """Build the error the Files API returns for missing or expired files."""
+        return errors.ClientError(403, {"error": {
+            "code": 403,
+            "message": f"You do not have permission to access the File {name} or it may not exist.",
+            "status": "PERMISSION_DENIED",
+        }})
+
+    def _live_file(self, name: str) -> types.File:
+        """Return a stored file, raising if it has expired or was deleted."""
+        with self._lock:
+            file = self.files.get(name)
+            if file is not None and file.expiration_time <= datetime.now(timezone.utc):
+                # Expired files are removed just like on the real service
+                del self.files[name]
+                file = None
+        if file is None:
+            raise self._not_found(name)
+        return file
+
+    def upload(self, file, config=None) -> types.File:
+        """Store a file and return its metadata."""
+        self._sleep(self.upload_latency)
+        self._maybe_fail("files.upload")
+
+        config = dict(config or {})
+        if isinstance(file, (str, os.PathLike)):
+            size = os.path.getsize(file)
+            display_name = config.get("display_name") or os.path.basename(file)
+        else:
+            data = file.read() if isinstance(file, io.IOBase) else bytes(file)
+            size = len(data)
+            display_name = config.get("display_name")
+
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            name = f"files/fake{next(self._ids):06d}"
+            stored = types.File(
+                name=name,
+                display_name=display_name,
+                mime_type=config.get("mime_type", "application/pdf"),
+                size_bytes=size,
+                create_time=now,
+                update_time=now,
+                expiration_time=now + timedelta(seconds=self.file_ttl),
+                uri=f"https://fake-gemini.local/v1beta/{name}",
+                state=types.FileState.ACTIVE,
+            )
+            self.files[name] = stored
+        return stored
+
+    def expire(self, name: str = None):
+        """Expire one file (or every file) immediately."""
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        with self._lock:
+            for file_name, file in self.files.items():
+                if name is None or file_name == name:
+                    file.expiration_time = past
+
+    def generate(self, contents, model: str = None) -> tuple:
+        """Validate the attached files and return (text, usage_metadata)."""
+        self._sleep(self.latency)
+        self._maybe_fail("chats.send_message", model)
+
+        if not isinstance(contents, list):
+            contents = [contents]
+        prompt_tokens = 0
+        for part in contents:
+            if isinstance(part, types.File):
+                stored = self._live_file(part.name)
+                prompt_tokens += int((stored.size_bytes or 0) / 1024 * self.tokens_per_file_kb) + 1
+            else:
+                prompt_tokens += max(1, len(str(part)) // 4)
+
+        text = self.model_responses.get(model, self.response_text)
+        output_tokens = max(1, len(text) // 4)
+        with self._lock:
+            self.tokens["input"] += prompt_tokens
+            self.tokens["output"] += output_tokens
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+        return text, usage
+
+
+def _response(text: str, usage=None) -> types.GenerateContentResponse:
+    """Wrap text in a real GenerateContentResponse."""
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+        usage_metadata=usage,
+    )
+
+
+class FakeFiles:
+    """Stand-in for client.files."""
+
+    def __init__(self, backend: FakeGeminiBackend):
+        self._backend = backend
+
+    def upload(self, *, file, config=None):
+        return self._backend.upload(file, config)
+
+    def get(self, *, name, config=None):
+        self._backend._maybe_fail("files.get")
+        return self._backend._live_file(name)
+
+    def delete(self, *, name, config=None):
+        self._backend._maybe_fail("files.delete")
+        with self._backend._lock:
+            if self._backend.files.pop(name, None) is None:
+                raise self._backend._not_found(name)
+
+    def list(self, *, config=None):
+        self._backend._maybe_fail("files.list")
+        now = datetime.now(timezone.utc)
+        with self._backend._lock:
+            return iter([f for f in self._backend.files.values() if f.expiration_time > now])
+
+
+class FakeChat:
+    """Stand-in for a chat session returned by client.chats.create."""
+
+    def __init__(self, backend: FakeGeminiBackend, model: str, config=None, history=None):
+        self._backend = backend
+        self.model = model
+        self.config = config
+        self.history = list(history or [])
+
+    def get_history(self, curated: bool = False):
+        return list(self.history)
+
+    def send_message(self, message, config=None):
+        text, usage = self._backend.generate(message, self.model)
+        if self._backend.tokens_per_second:
+            # Non-streaming calls still wait for the whole answer to be generated
+            time.sleep(usage.candidates_token_count / self._backend.tokens_per_second)
+        self.history.append(message)
+        return _response(text, usage)
+
+    def send_message_stream(self, message, config=None):
+        text, usage = self._backend.generate(message, self.model)
+        self.history.append(message)
+        # Stream roughly one token (four characters) per chunk
+        chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+        delay = 1 / self._backend.tokens_per_second if self._backend.tokens_per_second else 0
+        for i, chunk in enumerate(chunks):
+            if delay:
+                time.sleep(delay)
+            yield _response(chunk, usage if i == len(chunks) - 1 else None)
+
+
+class FakeChats:
+    """Stand-in for client.chats."""
+
+    def __init__(self, backend: FakeGeminiBackend):
+        self._backend = backend
+
+    def create(self, *, model, config=None, history=None):
+        self._backend._maybe_fail("chats.create")
+        return FakeChat(self._backend, model, config, history)
+
+
+class FakeClient:
+    """Drop-in replacement for google.genai.Client backed by a FakeGeminiBackend."""
+
+    def __init__(self, backend: FakeGeminiBackend = None, api_key: str = None):
+        self.backend = backend or FakeGeminiBackend()
+        self.files = FakeFiles(self.backend)
+        self.chats = FakeChats(self.backend)
+
+
+class FakeHTTPResponse:
+    """Minimal httpx.Response stand-in for the reference downloads."""
+
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+def fake_pdf(size: int = 512 * 1024) -> bytes:
+    """Return a one-page PDF padded to roughly size bytes with an attachment."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.add_attachment("padding.bin", b"0" * max(0, size - 1024))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def fake_download(size: int = 512 * 1024, latency: float = 0.0, available: bool = True):
+    """Return an httpx.get replacement that serves a fixed-size one-page PDF.
+
+    With available=False every request fails like an unreachable site, after the latency.
+    """
+    payload = fake_pdf(size)
+
+    def get(url, **kwargs):
+        if latency:
+            time.sleep(latency)
+        if not available:
+            raise ConnectionError(f"Could not connect to {url}")
+        return FakeHTTPResponse(payload)
+
+    return get
@@ -0,0 +1,283 @@
+"""
+Janitor for ComplegalAI storage.
+
+Deletes Gemini files this deployment uploaded that no live session
+references, sweeps stale PDFs from the local spool directory and keeps remote
+storage under a quota by evicting files according to a policy. It can be run
+by hand (or from cron) as a CLI, or as a background thread inside the app.
+
+Usage:
+    python janitor.py                      # one pass over remote files and the spool
+    python janitor.py --dry-run            # report what would be deleted
+    python janitor.py --max-remote-gb 15 --policy largest
+
+Every upload the app makes is recorded with record_uploads(); files that
+aren't recorded belong to another deployment, a dev machine or
+another tool sharing the API key, and are never deleted. Sessions record the
+Gemini files they use with mark_live() in the shared store; entries that
+haven't been refreshed for LIVE_SESSION_TTL seconds are treated as abandoned. Reference documents registered by references.py are
+never deleted. When several replicas run the background janitor, a lease
+makes sure only one of them sweeps remote storage at a time.
+"""
+
+import argparse
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+import store
+
+# Directory for PDFs written during processing (matched by cleanup.py as temp_*.pdf)
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_PREFIX = "temp_"
+
+# Sessions that haven't touched their files for this long are considered gone
+LIVE_SESSION_TTL = float(os.getenv("LIVE_SESSION_TTL", str(2 * 60 * 60)))
+
+# Never delete remote files younger than this, so in-flight uploads are safe
+REMOTE_MIN_AGE = float(os.getenv("JANITOR_REMOTE_MIN_AGE", str(15 * 60)))
+
+# Local spool files older than this are swept
+SPOOL_MAX_AGE = float(os.getenv("JANITOR_SPOOL_MAX_AGE", str(60 * 60)))
+
+# The Files API allows 20 GB per project; stay below it by default
+MAX_REMOTE_BYTES = int(float(os.getenv("JANITOR_MAX_REMOTE_GB", "18")) * 1024 ** 3)
+
+EVICTION_POLICIES = ("lru", "oldest", "largest")
+
+_lock = threading.Lock()
+_thread = None
+
+
+def record_uploads(file_names):
+    """Record Gemini files this deployment uploaded, making them eligible for cleanup."""
+    store.record_uploads(file_names)
+
+
+def mark_live(file_names, session_id: str):
+    """Record (or refresh) the Gemini files a session is using."""
+    store.mark_live(file_names, session_id)
+
+
+def release(session_id: str):
+    """Forget every file held by a session so the janitor can delete it."""
+    store.release_session(session_id)
+
+
+def live_files() -> dict:
+    """Return the files held by sessions that are still active."""
+    return store.live_files(time.time() - LIVE_SESSION_TTL)
+
+
+def reference_files() -> set:
+    """Return the names of the registered reference document uploads."""
+    return {entry["name"] for entry in store.all_references().values() if entry.get("name")}
+
+
+def spool_path(suffix: str = ".pdf") -> str:
+    """Return a new unique path in the spool directory."""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return os.path.join(SPOOL_DIR, f"{SPOOL_PREFIX}{os.getpid()}_{time.time_ns()}{suffix}")
+
+
+def sweep_spool(max_age: float = SPOOL_MAX_AGE, dry_run: bool = False) -> dict:
+    """Delete spool files older than max_age seconds."""
+    cutoff = time.time() - max_age
+    result = {"files": 0, "bytes": 0}
+    for path in glob.glob(os.path.join(SPOOL_DIR, f"{SPOOL_PREFIX}*")):
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                os.remove(path)
+        except OSError:
+            # Already removed by the request that created it
+            continue
+        result["files"] += 1
+        result["bytes"] += stat.st_size
+    if not dry_run:
+        metrics.inc_counter("complegal_janitor_reclaimed_bytes_total", result["bytes"], target="spool")
+    return result
+
+
+def _age_seconds(created) -> float:
+    if created is None:
+        return float("inf")
+    return (datetime.now(timezone.utc) - created).total_seconds()
+
+
+def _delete_remote_file(client, file, dry_run: bool) -> bool:
+    if dry_run:
+        return True
+    try:
+        client.files.delete(name=file.name)
+        return True
+    except Exception as e:
+        print(f"Could not delete {file.name}: {str(e)}")
+        return False
+
+
+def sweep_remote(client, max_bytes: int = MAX_REMOTE_BYTES, policy: str = "lru",
+                 min_age: float = REMOTE_MIN_AGE, dry_run: bool = False) -> dict:
+    """Delete orphaned Gemini files, then evict files until under max_bytes.
+
+    Only files recorded with record_uploads() are deleted or evicted; the
+    quota still counts everything in the project. Eviction never touches
+    reference documents, files held by a live session or files younger than
+    min_age. Policies:
+        lru      files of the least recently active sessions first
+        oldest   oldest uploads first
+        largest  largest uploads first
+    """
+    if policy not in EVICTION_POLICIES:
+        raise ValueError(f"Unknown eviction policy: {policy}")
+
+    live = live_files()
+    protected = reference_files()
+    owned = store.uploaded_files()
+    result = {"orphaned_files": 0, "evicted_files": 0, "bytes": 0, "remaining_bytes": 0}
+
+    with metrics.span("janitor_remote", dry_run=dry_run) as attributes:
+        kept = []
+        deleted = []
+        listed = set()
+        for file in client.files.list():
+            size = file.size_bytes or 0
+            listed.add(file.name)
+            if (file.name not in owned or file.name in protected or file.name in live
+                    or _age_seconds(file.create_time) < min_age):
+                kept.append(file)
+                continue
+            if _delete_remote_file(client, file, dry_run):
+                deleted.append(file.name)
+                result["orphaned_files"] += 1
+                result["bytes"] += size
+            else:
+                kept.append(file)
+
+        # Enforce the storage quota on what's left
+        total = sum(file.size_bytes or 0 for file in kept)
+        if total > max_bytes:
+            # Files in use or still being uploaded are never evicted, even over quota
+            candidates = [file for file in kept if file.name in owned and file.name not in protected
+                          and file.name not in live and _age_seconds(file.create_time) >= min_age]
+            if policy == "lru":
+                # Includes sessions past LIVE_SESSION_TTL; released files sort first
+                last_seen = store.live_files(0)
+                candidates.sort(key=lambda f: last_seen.get(f.name, {}).get("last_seen", 0))
+            elif policy == "oldest":
+                candidates.sort(key=lambda f: _age_seconds(f.create_time), reverse=True)
+            else:
+                candidates.sort(key=lambda f: f.size_bytes or 0, reverse=True)
+            for file in candidates:
+                if total <= max_bytes:
+                    break
+                if _delete_remote_file(client, file, dry_run):
+                    deleted.append(file.name)
+                    result["evicted_files"] += 1
+                    result["bytes"] += file.size_bytes or 0
+                    total -= file.size_bytes or 0
+        result["remaining_bytes"] = total
+
+        attributes.update(result)
+
+    if not dry_run:
+        # Forget deleted uploads and ones that expired on their own
+        gone = [name for name, uploaded_at in owned.items()
+                if name not in listed and time.time() - uploaded_at >= min_age]
+        store.forget_uploads(deleted + gone)
+
+    if not dry_run:
+        metrics.inc_counter("complegal_janitor_reclaimed_bytes_total", result["bytes"], target="remote")
+        metrics.inc_counter("complegal_janitor_deleted_total", result["orphaned_files"], target="orphaned")
+        metrics.inc_counter("complegal_janitor_deleted_total", result["evicted_files"], target="evicted")
+    return result
+
+
+def run_once(client=None, dry_run: bool = False, **options) -> dict:
+    """Run one janitor pass over the spool and, if a client is given, remote storage."""
+    result = {"spool": sweep_spool(options.pop("spool_max_age", SPOOL_MAX_AGE), dry_run)}
+    if client is not None:
+        result["remote"] = sweep_remote(client, dry_run=dry_run, **options)
+    return result
+
+
+def _loop(get_client, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            # Every replica sweeps its own spool, but only one sweeps remote storage per interval
+            client = get_client() if store.acquire_lease("janitor", interval) else None
+            run_once(client)
+        except Exception as e:
+            # Keep the thread alive; the next pass will try again
+            print(f"Janitor pass failed: {str(e)}")
+
+
+def start_background_janitor(get_client, interval: float = None):
+    """Start the janitor in a daemon thread (once per process).
+
+    get_client is called before every pass so the thread always uses the
+    current client; it may return None to sweep the local spool only.
+    """
+    global _thread
+    if interval is None:
+        interval = float(os.getenv("JANITOR_INTERVAL", "0") or 0)
+    if interval <= 0:
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, args=(get_client, interval), name="janitor", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from warmup import get_api_key
+
+    parser = argparse.ArgumentParser(description="Delete orphaned Gemini files and stale spool files.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting")
+    parser.add_argument("--local-only", action="store_true", help="Only sweep the local spool directory")
+    parser.add_argument("--max-remote-gb", type=float, default=MAX_REMOTE_BYTES / 1024 ** 3,
+                        help="Evict files until remote storage is below this size")
+    parser.add_argument("--policy", choices=EVICTION_POLICIES, default="lru", help="Eviction policy for the quota")
+    parser.add_argument("--min-age", type=float, default=REMOTE_MIN_AGE,
+                        help="Never delete remote files younger than this many seconds")
+    parser.add_argument("--spool-max-age", type=float, default=SPOOL_MAX_AGE,
+                        help="Delete spool files older than this many seconds")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = None
+    if not args.local_only:
+        api_key = get_api_key()
+        if api_key:
+            from google import genai
+            client = genai.Client(api_key=api_key)
+        else:
+            print("No Gemini API key found; sweeping the local spool only.")
+
+    result = run_once(client, dry_run=args.dry_run, spool_max_age=args.spool_max_age,
+                      max_bytes=int(args.max_remote_gb * 1024 ** 3), policy=args.policy, min_age=args.min_age)
+
+    action = "Would reclaim" if args.dry_run else "Reclaimed"
+    spool = result["spool"]
+    print(f"{action} {_format_bytes(spool['bytes'])} from {spool['files']} spool files")
+    if "remote" in result:
+        remote = result["remote"]
+        print(f"{action} {_format_bytes(remote['bytes'])} from {remote['orphaned_files']} orphaned and "
+              f"{remote['evicted_files']} evicted Gemini files")
+        print(f"Remote storage in use: {_format_bytes(remote['remaining_bytes'])}")
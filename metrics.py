@@ -0,0 +1,259 @@
+"""
+Instrumentation for ComplegalAI.
+
+Records Prometheus-style counters and histograms and trace spans for Gemini
+calls, reference downloads and history I/O. Metrics are served in the
+Prometheus text format on a local endpoint, next to a /health check that
+reports the state of each external dependency, and spans are appended to a
+JSON lines log so they can be fed into dashboards.
+
+Configuration (environment variables):
+    METRICS_PORT      Port for the local metrics endpoint (default 9464, 0 disables it)
+    METRICS_LOG_PATH  JSON lines file for trace spans (default logs/spans.jsonl, empty disables it)
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets in seconds, sized for uploads and long model responses
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_span_stack = threading.local()
+_server = None
+
+
+def _key(name, labels):
+    """Build a hashable registry key from a metric name and its labels."""
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def inc_counter(name: str, value: float = 1, **labels):
+    """Increment a counter by the given value."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """Record a value in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+            _histograms[key] = histogram
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Return True if an exception looks like a 429 / quota error."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code == 429:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def record_retry(stage: str, error: Exception):
+    """Count a retry for a stage, noting whether it was caused by rate limiting."""
+    inc_counter("complegal_retries_total", stage=stage)
+    if is_rate_limited(error):
+        inc_counter("complegal_rate_limited_total", stage=stage)
+
+
+def record_usage(response, stage: str, **labels):
+    """Record token usage from a Gemini response's usage_metadata, if present."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    tokens = {}
+    for attr, kind in (
+        ("prompt_token_count", "input"),
+        ("candidates_token_count", "output"),
+        ("cached_content_token_count", "cached"),
+        ("total_token_count", "total"),
+    ):
+        count = getattr(usage, attr, None)
+        if count:
+            inc_counter("complegal_gemini_tokens_total", count, stage=stage, type=kind, **labels)
+            tokens[kind] = count
+    return tokens
+
+
+def _write_span(record: dict):
+    """Append a finished span to the JSON lines log."""
+    path = os.getenv("METRICS_LOG_PATH", os.path.join("logs", "spans.jsonl"))
+    if not path:
+        return
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _lock, open(path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError:
+        # Tracing must never break the app
+        pass
+
+
+@contextmanager
+def span(stage: str, trace_id: str = None, **attributes):
+    """Time a stage, record its duration histogram and emit a trace span.
+
+    The yielded dict can be used to attach extra attributes (e.g. token counts)
+    to the span before it is written.
+    """
+    stack = getattr(_span_stack, "spans", None)
+    if stack is None:
+        stack = _span_stack.spans = []
+    parent = stack[-1] if stack else None
+    record = {
+        "trace_id": trace_id or (parent["trace_id"] if parent else uuid.uuid4().hex),
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": stage,
+        "start": time.time(),
+        "attributes": dict(attributes),
+    }
+    stack.append(record)
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except Exception as e:
+        status = "rate_limited" if is_rate_limited(e) else "error"
+        record["error"] = str(e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        observe("complegal_stage_duration_seconds", duration, stage=stage)
+        inc_counter("complegal_stage_calls_total", stage=stage, status=status)
+        record["status"] = status
+        record["duration_ms"] = round(duration * 1000, 3)
+        _write_span(record)
+
+
+def _format_labels(labels, extra=None):
+    """Format a label tuple in the Prometheus exposition format."""
+    pairs = list(labels) + (list(extra) if extra else [])
+    if not pairs:
+        return ""
+    escaped = ['%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs]
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        histograms = [(key, {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]})
+                      for key, h in histograms]
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), histogram in histograms:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> dict:
+    """Return all metrics as a JSON-serialisable dict."""
+    with _lock:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), "buckets": dict(zip(DEFAULT_BUCKETS, h["buckets"])),
+                 "sum": h["sum"], "count": h["count"]}
+                for (name, labels), h in sorted(_histograms.items(), key=lambda item: item[0])
+            ],
+        }
+
+
+def reset():
+    """Clear all recorded metrics."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve /metrics (Prometheus text), /metrics.json and /health."""
+
+    def do_GET(self):
+        if self.path == "/health":
+            # Imported here because breaker records its own metrics through this module
+            import breaker
+            body = json.dumps(breaker.health(), default=str).encode()
+            content_type = "application/json"
+        elif self.path == "/metrics":
+            body = render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(snapshot(), default=str).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the Streamlit console
+        pass
+
+
+def start_metrics_server(port: int = None):
+    """Start the metrics endpoint in a background thread (once per process)."""
+    global _server
+    if _server is not None:
+        return _server
+    if port is None:
+        port = int(os.getenv("METRICS_PORT", "9464") or 0)
+    if not port:
+        return None
+    with _lock:
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on port {port}: {e}")
+            return None
+        thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+        thread.start()
+        _server = server
+    return _server
@@ -0,0 +1,306 @@
+"""
+PDF preprocessing for ComplegalAI.
+
+Medical report bundles often contain scanned pages at 300+ dpi, repeated
+cover sheets and the same record excerpts in several files. Before a claim is
+uploaded, this module:
+
+- drops pages that repeat an earlier page anywhere in the claim. Pages with
+  text are matched on their normalized text together with a perceptual hash
+  of their largest image, so a rescan with an identical OCR layer matches
+  even when the bytes differ. Pages without text (bare scans) are only
+  dropped when they are exact copies. The first copy of each page is kept.
+- downsamples embedded images above the target DPI and re-encodes them as
+  JPEG, keeping the original whenever the new copy isn't smaller.
+
+Each file is hashed and rewritten in a worker process, so large bundles use
+all cores. Gemini bills every PDF page as a fixed number of tokens, so the
+estimated token saving comes from the dropped pages and the byte saving from
+both steps.
+
+Usage:
+    python preprocess.py report1.pdf report2.pdf --out-dir spool
+
+Configuration (environment variables):
+    PREPROCESS_ENABLED        Set to 0 to upload PDFs untouched (default 1)
+    PREPROCESS_WORKERS        Worker processes (default: number of CPUs)
+    PREPROCESS_TARGET_DPI     Downsample images above this resolution (default 150)
+    PREPROCESS_JPEG_QUALITY   JPEG quality for downsampled images (default 75)
+    PREPROCESS_HASH_DISTANCE  Bits the image hashes of two pages with the same text may differ by (default 32 of 1024)
+"""
+
+import argparse
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+ENABLED = os.getenv("PREPROCESS_ENABLED", "1") != "0"
+WORKERS = int(os.getenv("PREPROCESS_WORKERS", "0") or 0) or os.cpu_count() or 1
+TARGET_DPI = int(os.getenv("PREPROCESS_TARGET_DPI", "150"))
+JPEG_QUALITY = int(os.getenv("PREPROCESS_JPEG_QUALITY", "75"))
+HASH_DISTANCE = int(os.getenv("PREPROCESS_HASH_DISTANCE", "32"))
+
+# Gemini counts each PDF page as 258 tokens
+TOKENS_PER_PAGE = 258
+
+# Perceptual hash size: a 32x32 average hash (1024 bits)
+HASH_SIZE = 32
+
+_lock = threading.Lock()
+_pool = None
+
+
+def _average_hash(image) -> int:
+    """Return a perceptual hash of a PIL image: one bit per cell, set where it's darker than average."""
+    from PIL import Image
+
+    pixels = image.convert("L").resize((HASH_SIZE, HASH_SIZE), Image.BILINEAR).tobytes()
+    mean = sum(pixels) / len(pixels)
+    value = 0
+    for pixel in pixels:
+        value = (value << 1) | (pixel < mean)
+    return value
+
+
+def _exact_digest(page) -> str:
+    """Return a digest of a page's drawing instructions and the raw bytes of every image it draws."""
+    digest = hashlib.sha1()
+    contents = page.get_contents()
+    digest.update(contents.get_data() if contents is not None else b"")
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is not None:
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            digest.update(name.encode())
+            digest.update(xobjects[name].get_object().get_data())
+    return digest.hexdigest()
+
+
+def _page_key(page) -> tuple:
+    """Return (content digest, image hash) identifying a page's content.
+
+    Pages with text match on the text and, within HASH_DISTANCE, a perceptual
+    hash of their largest image. Pages without text only match exact copies:
+    a perceptual hash can't tell a rescan from a page with one changed line.
+    """
+    text = re.sub(r"\s+", " ", page.extract_text() or "").strip().lower()
+    if not text:
+        try:
+            return "exact:" + _exact_digest(page), None
+        except Exception:
+            # Nothing reliable to compare; never treat this page as a duplicate
+            return "unique:" + uuid.uuid4().hex, None
+
+    image_hash = None
+    largest = 0
+    try:
+        for image_file in page.images:
+            image = image_file.image
+            if image is not None and image.width * image.height > largest:
+                largest = image.width * image.height
+                image_hash = _average_hash(image)
+    except Exception:
+        # Unsupported image encodings just don't contribute to the key
+        pass
+    return hashlib.sha1(text.encode()).hexdigest(), image_hash
+
+
+def hash_pages(path: str) -> list:
+    """Return the content key of every page in a PDF."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [_page_key(page) for page in reader.pages]
+
+
+def _matches(key: tuple, other: tuple, max_distance: int) -> bool:
+    if key[0] != other[0]:
+        return False
+    if key[1] is None or other[1] is None:
+        return key[1] == other[1]
+    return bin(key[1] ^ other[1]).count("1") <= max_distance
+
+
+def find_duplicates(page_keys: list, max_distance: int = HASH_DISTANCE) -> list:
+    """Return, for each file, the indexes of pages that repeat an earlier page in the claim."""
+    seen = {}
+    duplicates = []
+    for keys in page_keys:
+        dropped = []
+        for index, key in enumerate(keys):
+            # Only pages with the same text can match, so compare within that group
+            group = seen.setdefault(key[0], [])
+            if any(_matches(key, other, max_distance) for other in group):
+                dropped.append(index)
+            else:
+                group.append(key)
+        duplicates.append(dropped)
+    return duplicates
+
+
+def _downsample(page, target_dpi: int, quality: int, done: set) -> int:
+    """Downsample a page's oversized images in place and return the bytes saved."""
+    from PIL import Image
+
+    # Assume each image fills the page; the real resolution is never lower than this
+    page_inches = max(float(page.mediabox.width), float(page.mediabox.height)) / 72
+    saved = 0
+    for image_file in page.images:
+        ref = image_file.indirect_reference
+        ref_id = (ref.idnum, ref.generation) if ref is not None else None
+        if ref_id in done:
+            continue
+        done.add(ref_id)
+        try:
+            image = image_file.image
+            if image.mode not in ("RGB", "L") or not page_inches:
+                continue
+            scale = target_dpi / (max(image.width, image.height) / page_inches)
+            if scale >= 1:
+                continue
+            resized = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                                   Image.LANCZOS)
+            # Pillow stores RGB and greyscale images in PDFs as JPEG, so this is the size replace() will write
+            encoded = io.BytesIO()
+            resized.save(encoded, "JPEG", quality=quality)
+            original_size, new_size = len(image_file.data), encoded.tell()
+            if new_size >= original_size:
+                continue
+            image_file.replace(resized, quality=quality)
+            saved += original_size - new_size
+        except Exception:
+            # Leave images pypdf or Pillow can't decode untouched
+            continue
+    return saved
+
+
+def rewrite_pdf(path: str, out_path: str, drop: list = (), target_dpi: int = TARGET_DPI,
+                quality: int = JPEG_QUALITY) -> dict:
+    """Write a copy of a PDF without the dropped pages and with oversized images downsampled."""
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    drop = set(drop)
+    for index, page in enumerate(reader.pages):
+        if index not in drop:
+            writer.add_page(page)
+
+    image_bytes_saved = 0
+    done = set()
+    for page in writer.pages:
+        if target_dpi:
+            image_bytes_saved += _downsample(page, target_dpi, quality, done)
+        page.compress_content_streams()
+    writer.compress_identical_objects()
+
+    with open(out_path, "wb") as f:
+        writer.write(f)
+
+    original_bytes = os.path.getsize(path)
+    new_bytes = os.path.getsize(out_path)
+    if new_bytes >= original_bytes and not drop:
+        # Nothing to gain; upload the original bytes
+        shutil.copyfile(path, out_path)
+        new_bytes = original_bytes
+    return {
+        "pages": len(reader.pages),
+        "dropped_pages": len(drop),
+        "original_bytes": original_bytes,
+        "bytes": new_bytes,
+        "image_bytes_saved": image_bytes_saved,
+    }
+
+
+def _get_pool(workers: int):
+    """Return the shared worker pool, creating it on first use."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Spawn rather than fork: the app runs other threads that must not be copied
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _map(function, *iterables, workers: int):
+    """Run function over the inputs, in the worker pool when there is more than one."""
+    arguments = list(zip(*iterables))
+    if workers <= 1 or len(arguments) <= 1:
+        return [function(*args) for args in arguments]
+    return list(_get_pool(workers).map(function, *zip(*arguments)))
+
+
+def preprocess_claim(pdf_paths: list, out_paths: list, workers: int = WORKERS, target_dpi: int = TARGET_DPI,
+                     quality: int = JPEG_QUALITY, max_distance: int = HASH_DISTANCE) -> dict:
+    """Deduplicate pages across a claim's PDFs and write compressed copies to out_paths.
+
+    Returns {"paths": [...], "files": [...], "totals": {...}}. paths lines up
+    with pdf_paths and is None for files whose every page repeats an earlier
+    file, which need not be uploaded at all.
+    """
+    page_keys = _map(hash_pages, pdf_paths, workers=workers)
+    duplicates = find_duplicates(page_keys, max_distance)
+
+    # Files made up entirely of repeated pages are skipped rather than rewritten
+    jobs = [i for i, keys in enumerate(page_keys) if len(duplicates[i]) < len(keys) or not keys]
+    results = _map(rewrite_pdf, [pdf_paths[i] for i in jobs], [out_paths[i] for i in jobs],
+                   [duplicates[i] for i in jobs], [target_dpi] * len(jobs), [quality] * len(jobs),
+                   workers=workers)
+
+    files = []
+    paths = [None] * len(pdf_paths)
+    for i, path in enumerate(pdf_paths):
+        if i in jobs:
+            result = results[jobs.index(i)]
+            paths[i] = out_paths[i]
+        else:
+            size = os.path.getsize(path)
+            result = {"pages": len(page_keys[i]), "dropped_pages": len(page_keys[i]),
+                      "original_bytes": size, "bytes": 0, "image_bytes_saved": 0}
+        result["bytes_saved"] = result["original_bytes"] - result["bytes"]
+        result["tokens_saved"] = result["dropped_pages"] * TOKENS_PER_PAGE
+        files.append(result)
+
+    totals = {key: sum(f[key] for f in files)
+              for key in ("pages", "dropped_pages", "original_bytes", "bytes", "bytes_saved", "tokens_saved")}
+    return {"paths": paths, "files": files, "totals": totals}
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop duplicate pages and downsample scans in a claim's PDFs.")
+    parser.add_argument("pdfs", nargs="+", help="PDF files making up one claim, in upload order")
+    parser.add_argument("--out-dir", default="preprocessed", help="Directory for the processed copies")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes")
+    parser.add_argument("--target-dpi", type=int, default=TARGET_DPI,
+                        help="Downsample images above this resolution (0 disables)")
+    parser.add_argument("--quality", type=int, default=JPEG_QUALITY, help="JPEG quality for downsampled images")
+    parser.add_argument("--hash-distance", type=int, default=HASH_DISTANCE,
+                        help="Bits the image hashes of two pages with the same text may differ by")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    outputs = [os.path.join(args.out_dir, os.path.basename(path)) for path in args.pdfs]
+    report = preprocess_claim(args.pdfs, outputs, workers=args.workers, target_dpi=args.target_dpi,
+                              quality=args.quality, max_distance=args.hash_distance)
+
+    for path, out_path, result in zip(args.pdfs, report["paths"], report["files"]):
+        target = out_path or "(skipped, every page is a duplicate)"
+        print(f"{path} -> {target}: {result['dropped_pages']}/{result['pages']} pages dropped, "
+              f"{_format_bytes(result['original_bytes'])} -> {_format_bytes(result['bytes'])}")
+    totals = report["totals"]
+    print(f"Saved {_format_bytes(totals['bytes_saved'])} and about {totals['tokens_saved']:,} tokens "
+          f"({totals['dropped_pages']} of {totals['pages']} pages dropped)")
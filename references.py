@@ -0,0 +1,237 @@
+"""
+Reference documents shared by every ComplegalAI chat session.
+
+The PDRS and the 2025 Permanent Disability and Benefits Schedule are
+downloaded once, kept on local disk and uploaded to the Gemini Files API once.
+The resulting file handles are recorded in the shared store so every
+session, replica and the warm-up run at container start can reuse them until
+they expire. When several processes need a new upload at the same time, a
+lease elects one of them to do it and the others wait for its result.
+
+Downloads and Files API calls go through circuit breakers (breaker.py). If a
+reference site is down, the last copy downloaded successfully is used even
+when it is older than REFERENCE_MAX_AGE. Saved copies are stored with a
+SHA-256 checksum and only used while they match it and parse as a PDF.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import breaker
+import metrics
+import store
+
+# Reference PDFs included in every chat session
+REFERENCE_DOCUMENTS = {
+    "pdrs": {
+        "label": "Permanent Disability Rating Schedule",
+        "url": "https://www.dir.ca.gov/dwc/PDR.pdf",
+    },
+    "chart": {
+        "label": "2025 Permanent Disability and Benefits Schedule",
+        "url": "https://static1.squarespace.com/static/5c2fcec6b27e396baf7e4a61/t/6781a510620dc016b6b6a82e/1736549648905/2025+Permanent+Disability+and+Benefits+Schedule.pdf",
+    },
+}
+
+# Local cache for downloaded PDFs
+REFERENCE_CACHE_DIR = os.getenv("REFERENCE_CACHE_DIR", os.path.join("cache", "references"))
+
+# How long a downloaded copy is trusted before it is fetched again
+REFERENCE_MAX_AGE = float(os.getenv("REFERENCE_MAX_AGE", str(7 * 24 * 60 * 60)))
+
+# Don't hand out file handles that expire within this window
+EXPIRY_MARGIN = timedelta(hours=1)
+
+# Seconds to wait for a reference site before giving up on a download
+DOWNLOAD_TIMEOUT = float(os.getenv("REFERENCE_DOWNLOAD_TIMEOUT", "30"))
+
+# How long one process may hold the upload lease before others take over
+UPLOAD_LEASE_TTL = float(os.getenv("REFERENCE_UPLOAD_LEASE_TTL", "300"))
+
+# Name shown for the Files API circuit in the health status
+FILES_API_LABEL = "Gemini Files API"
+
+_lock = threading.Lock()
+_handles = {}
+
+
+def _client_key(client) -> str:
+    """Identify the API key a client uses so handles are never shared across projects."""
+    api_key = getattr(getattr(client, "_api_client", None), "api_key", None) or ""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def _local_path(key: str) -> str:
+    return os.path.join(REFERENCE_CACHE_DIR, f"{key}.pdf")
+
+
+def _checksum_path(key: str) -> str:
+    return os.path.join(REFERENCE_CACHE_DIR, f"{key}.sha256")
+
+
+def has_saved_copy(key: str) -> bool:
+    """Return True if a reference document has been downloaded before."""
+    return os.path.exists(_local_path(key)) and os.path.exists(_checksum_path(key))
+
+
+def _is_fresh(expiration_time) -> bool:
+    """Return True if a file handle is still usable for a while."""
+    if expiration_time is None:
+        return True
+    if isinstance(expiration_time, str):
+        expiration_time = datetime.fromisoformat(expiration_time)
+    return expiration_time - EXPIRY_MARGIN > datetime.now(timezone.utc)
+
+
+def _is_valid_pdf(pdf_data: bytes) -> bool:
+    """Return True if the bytes parse as a PDF with at least one page."""
+    from pypdf import PdfReader
+
+    try:
+        return len(PdfReader(io.BytesIO(pdf_data)).pages) > 0
+    except Exception:
+        return False
+
+
+def _read_local(key: str):
+    """Return the saved copy of a reference document, or None if it is missing or damaged."""
+    try:
+        with open(_local_path(key), "rb") as f:
+            pdf_data = f.read()
+        with open(_checksum_path(key)) as f:
+            checksum = f.read().strip()
+    except OSError:
+        return None
+    if hashlib.sha256(pdf_data).hexdigest() != checksum or not _is_valid_pdf(pdf_data):
+        # Truncated, overwritten or not written by save_local_copy(); download it again
+        metrics.inc_counter("complegal_reference_invalid_copies_total", reference=key)
+        return None
+    return pdf_data
+
+
+def save_local_copy(key: str, pdf_data: bytes):
+    """Save a downloaded reference document with its checksum."""
+    os.makedirs(REFERENCE_CACHE_DIR, exist_ok=True)
+    for path, data in ((_local_path(key), pdf_data),
+                       (_checksum_path(key), hashlib.sha256(pdf_data).hexdigest().encode())):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+def download_reference(key: str, trace_id: str = None) -> bytes:
+    """Return the reference PDF bytes, using the local copy while it is recent.
+
+    Falls back to an older local copy when the download fails or the site's
+    circuit is open; raises only if there is no intact local copy at all.
+    """
+    path = _local_path(key)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < REFERENCE_MAX_AGE:
+        pdf_data = _read_local(key)
+        if pdf_data is not None:
+            return pdf_data
+
+    import httpx
+
+    document = REFERENCE_DOCUMENTS[key]
+    try:
+        with breaker.guard(f"reference:{key}", f"{document['label']} download"), \
+                metrics.span("reference_download", trace_id=trace_id, reference=key) as attributes:
+            response = httpx.get(document["url"], timeout=DOWNLOAD_TIMEOUT, follow_redirects=True)
+            response.raise_for_status()
+            pdf_data = response.content
+            # Outage pages are often served with a 200; only keep real PDFs
+            if not _is_valid_pdf(pdf_data):
+                raise ValueError(f"{document['url']} did not return a PDF")
+            attributes["bytes"] = len(pdf_data)
+    except Exception as e:
+        saved = _read_local(key)
+        if saved is None:
+            raise
+        # Use the last known-good copy until the site is back
+        metrics.inc_counter("complegal_reference_fallbacks_total", reference=key)
+        print(f"Using the saved copy of {document['label']}: {str(e)}")
+        return saved
+
+    # Keep a local copy so later sessions and restarts skip the download
+    save_local_copy(key, pdf_data)
+    return pdf_data
+
+
+def _registered_file(client, handle_key: str, key: str, trace_id: str = None):
+    """Return the file registered in the shared store if it is still usable, else None."""
+    entry = store.get_reference(handle_key)
+    if not entry or not _is_fresh(entry.get("expiration_time")):
+        return None
+    try:
+        with breaker.guard("files", FILES_API_LABEL), \
+                metrics.span("reference_lookup", trace_id=trace_id, reference=key):
+            handle = client.files.get(name=entry["name"])
+    except Exception:
+        # The registered file is gone, or the Files API is down and the upload below will say so
+        return None
+    return handle if _is_fresh(handle.expiration_time) else None
+
+
+def get_reference_file(client, key: str, trace_id: str = None):
+    """Return an uploaded Gemini file for a reference document, uploading it if needed."""
+    handle_key = f"{_client_key(client)}:{key}"
+
+    with _lock:
+        handle = _handles.get(handle_key)
+    if handle is not None and _is_fresh(handle.expiration_time):
+        return handle
+
+    # Another session, replica or the warm-up run may already have uploaded it
+    handle = _registered_file(client, handle_key, key, trace_id)
+
+    # Sessions share a process, so the lease is held per thread
+    lease = f"reference:{handle_key}"
+    owner = f"{store.owner_id()}:{threading.get_ident()}"
+    if handle is None and not store.acquire_lease(lease, UPLOAD_LEASE_TTL, owner):
+        # Someone else is uploading it; wait for their result instead of uploading twice
+        deadline = time.time() + UPLOAD_LEASE_TTL
+        # Stop waiting if the Files API goes down; the upload below then fails fast
+        while handle is None and time.time() < deadline and not breaker.is_open("files"):
+            time.sleep(1)
+            handle = _registered_file(client, handle_key, key, trace_id)
+            if handle is None and store.acquire_lease(lease, UPLOAD_LEASE_TTL, owner):
+                # The other upload failed or its lease expired; take over
+                break
+
+    if handle is None:
+        try:
+            pdf_data = download_reference(key, trace_id)
+            with breaker.guard("files", FILES_API_LABEL), \
+                    metrics.span("reference_upload", trace_id=trace_id, reference=key, bytes=len(pdf_data)):
+                handle = client.files.upload(
+                    file=io.BytesIO(pdf_data),
+                    config=dict(mime_type='application/pdf', display_name=f"reference-{key}.pdf")
+                )
+            store.put_reference(
+                handle_key,
+                handle.name,
+                handle.expiration_time.isoformat() if handle.expiration_time else None,
+                datetime.now(timezone.utc).isoformat(),
+            )
+        finally:
+            store.release_lease(lease, owner)
+
+    with _lock:
+        _handles[handle_key] = handle
+    return handle
+
+
+def warm_up(client, trace_id: str = "warmup") -> dict:
+    """Download and register every reference document, returning the timing for each."""
+    timings = {}
+    for key in REFERENCE_DOCUMENTS:
+        start = time.perf_counter()
+        get_reference_file(client, key, trace_id)
+        timings[key] = time.perf_counter() - start
+    return timings
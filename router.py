@@ -0,0 +1,229 @@
+"""
+Model routing for ComplegalAI.
+
+Each message is sent on a route that names an ordered list of models, a
+timeout and a latency SLO. Lightweight prompts (follow-up questions, "Simple
+Analysis") use a fast model; full ratings use a stronger one. If a model
+times out or returns a 429/5xx the next model on the route is tried, and if a
+prompt that must produce rating strings comes back without them it is
+escalated straight to a stronger route.
+
+Each model's generate endpoint has a circuit breaker (breaker.py): while a
+model's circuit is open it is skipped without a request, so a model that is
+down costs a failed call only until its circuit opens.
+
+Chat sessions are tied to one model, so switching models continues the
+conversation in a new chat created from the current chat's history.
+
+Every attempt is recorded as a "model_call" span and in the
+complegal_route_* metrics so routing can be tuned from data:
+
+    python router.py --stats logs/spans.jsonl
+
+Routes can be overridden with a JSON file named by the ROUTER_CONFIG
+environment variable, using the same shape as ROUTES below.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+import breaker
+import metrics
+
+FLASH_MODEL = "gemini-2.5-flash-preview-04-17"
+PRO_MODEL = "gemini-2.5-pro-preview-03-25"
+FALLBACK_MODEL = "gemini-2.0-flash"
+
+# Ordered models per route, with a per-request timeout and latency SLO (seconds)
+ROUTES = {
+    "fast": {"models": [FLASH_MODEL, FALLBACK_MODEL], "timeout": 120, "slo": 30},
+    "structured": {"models": [FLASH_MODEL, FALLBACK_MODEL], "timeout": 180, "slo": 60, "escalate_to": "deep"},
+    "deep": {"models": [PRO_MODEL, FLASH_MODEL], "timeout": 600, "slo": 180},
+}
+
+# Relative strength of each model, used to pick the best answer when none passes validation
+MODEL_RANK = {FALLBACK_MODEL: 0, FLASH_MODEL: 1, PRO_MODEL: 2}
+
+# Route used to send the reports and references when a chat session starts
+CONTEXT_ROUTE = "fast"
+
+# Route and output check for each predefined prompt; free-form follow-ups use "fast"
+PROMPT_ROUTES = {
+    "Rating Analysis": ("deep", "rating"),
+    "Impairment Calculation": ("deep", "rating"),
+    "Simple Analysis": ("structured", "rating"),
+    "Negotiating and Settlement Demand": ("deep", None),
+    "Negotiation and Settlement Demand": ("deep", None),
+    "Settlement Estimation": ("deep", None),
+    "Treatment Recommendations": ("fast", None),
+}
+
+# PDRS rating strings start with an impairment number such as 15.03.01.00
+RATING_STRING = re.compile(r"\b\d{2}\.\d{2}\.\d{2}\.\d{2}\b")
+PD_TOTAL = re.compile(r"\bPD\b|permanent disability", re.IGNORECASE)
+
+
+def _load_routes() -> dict:
+    path = os.getenv("ROUTER_CONFIG")
+    if not path:
+        return ROUTES
+    with open(path, "r") as f:
+        return {**ROUTES, **json.load(f)}
+
+
+def route_for_prompt(prompt_name: str = None):
+    """Return (route, validator) for a predefined prompt name, or the follow-up route."""
+    return PROMPT_ROUTES.get(prompt_name, ("fast", None))
+
+
+def is_valid(text: str, validator: str = None) -> bool:
+    """Check a response against the structure a prompt requires."""
+    if validator is None:
+        return True
+    if validator == "rating":
+        return bool(text) and bool(RATING_STRING.search(text)) and bool(PD_TOTAL.search(text))
+    raise ValueError(f"Unknown validator: {validator}")
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return True for errors another model may not hit: timeouts, 429s and 5xx."""
+    if metrics.is_rate_limited(error):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int) and code >= 500:
+        return True
+    message = str(error)
+    return "Timeout" in type(error).__name__ or "DEADLINE_EXCEEDED" in message or "timed out" in message
+
+
+def send_message(client, chat, chat_model: str, message, route: str = "fast", validator: str = None,
+                 trace_id: str = None, claim_id: str = None, routes: dict = None):
+    """Send a message on a route, falling back and escalating as needed.
+
+    A timeout, 429 or 5xx moves on to the next model on the route, then to
+    the route it escalates to. An answer that fails the validator escalates
+    straight away, skipping models that have already answered. If no answer
+    passes, the one from the strongest model is returned.
+
+    chat may be None to start a new conversation. Returns (chat, model,
+    response) where chat is the session to continue with; it may be a new
+    chat on a different model that carries the earlier history. routes
+    replaces the configured routes (used by the evaluation harness).
+    """
+    routes = routes or _load_routes()
+    history = chat.get_history(curated=True) if chat is not None else []
+    last_error = None
+    best = None
+    answered = set()
+    attempt = 0
+    attempt_route = route
+    seen = set()
+
+    while attempt_route and attempt_route not in seen:
+        seen.add(attempt_route)
+        for model in routes[attempt_route]["models"]:
+            if model in answered:
+                continue
+            circuit = breaker.get(f"generate:{model}", f"Gemini {model}")
+            if not circuit.allow():
+                # Skip models known to be down and go straight to the next one
+                last_error = circuit.error()
+                metrics.inc_counter("complegal_route_calls_total", route=route, model=model, outcome="circuit_open")
+                continue
+
+            # Reuse the session when it's already on this model, otherwise replay its history
+            if chat is not None and model == chat_model and attempt == 0:
+                target = chat
+            else:
+                target = client.chats.create(model=model, history=list(history))
+            timeout = routes[attempt_route]["timeout"]
+            config = {"http_options": {"timeout": int(timeout * 1000)}}
+
+            start = time.perf_counter()
+            outcome = "ok"
+            with metrics.span("model_call", trace_id=trace_id, claim_id=claim_id, route=route,
+                              attempt_route=attempt_route, model=model, attempt=attempt) as attributes:
+                try:
+                    response = target.send_message(message, config=config)
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The model answered, just not successfully
+                        circuit.record_success()
+                        raise
+                    circuit.record_failure(e)
+                    last_error = e
+                    outcome = "fallback"
+                    metrics.record_retry(f"route_{route}", e)
+                else:
+                    circuit.record_success()
+                    attributes["tokens"] = metrics.record_usage(response, "model_call", route=route, model=model)
+                    if not is_valid(response.text, validator):
+                        outcome = "invalid"
+                attributes["outcome"] = outcome
+            attempt += 1
+
+            duration = time.perf_counter() - start
+            metrics.observe("complegal_route_duration_seconds", duration, route=route, model=model, outcome=outcome)
+            metrics.inc_counter("complegal_route_calls_total", route=route, model=model, outcome=outcome)
+            if outcome == "ok" and duration > routes[attempt_route].get("slo", float("inf")):
+                metrics.inc_counter("complegal_route_slo_misses_total", route=route, model=model)
+
+            if outcome == "ok":
+                return target, model, response
+            if outcome == "invalid":
+                answered.add(model)
+                # Later answers come from escalated routes, so they win ties between unranked models
+                rank = (MODEL_RANK.get(model, -1), attempt)
+                if best is None or rank > best[0]:
+                    best = (rank, (target, model, response))
+                # A weaker model on the same route won't do better; escalate
+                break
+        attempt_route = routes[attempt_route].get("escalate_to")
+
+    # No answer had the required structure: keep the strongest model's
+    if best is not None:
+        return best[1]
+    if last_error is None:
+        raise ValueError(f"Route {route} has no models to try")
+    raise last_error
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize_spans(path: str) -> dict:
+    """Summarize model_call spans from a span log by route and model."""
+    stats = {}
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("name") != "model_call":
+                continue
+            attributes = record.get("attributes", {})
+            key = (attributes.get("route"), attributes.get("model"))
+            entry = stats.setdefault(key, {"durations": [], "outcomes": {}, "input_tokens": 0, "output_tokens": 0})
+            entry["durations"].append(record["duration_ms"])
+            outcome = attributes.get("outcome", record.get("status"))
+            entry["outcomes"][outcome] = entry["outcomes"].get(outcome, 0) + 1
+            tokens = attributes.get("tokens") or {}
+            entry["input_tokens"] += tokens.get("input", 0)
+            entry["output_tokens"] += tokens.get("output", 0)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize model routing latency and token usage.")
+    parser.add_argument("--stats", default=os.path.join("logs", "spans.jsonl"), help="Span log to read")
+    args = parser.parse_args()
+
+    print(f"{'route':<12}{'model':<34}{'calls':>7}{'p50 ms':>11}{'p95 ms':>11}{'in tok':>11}{'out tok':>10}  outcomes")
+    for (route, model), entry in sorted(summarize_spans(args.stats).items(), key=lambda item: str(item[0])):
+        durations = entry["durations"]
+        print(f"{str(route):<12}{str(model):<34}{len(durations):>7}{_percentile(durations, 50):>11.0f}"
+              f"{_percentile(durations, 95):>11.0f}{entry['input_tokens']:>11}{entry['output_tokens']:>10}  "
+              f"{entry['outcomes']}")
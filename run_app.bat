@@ -31,6 +31,10 @@ if not exist .env (
     exit /b 1
 )
 
+REM Pre-fetch and register the reference documents
+echo Warming up reference documents...
+python warmup.py
+
 REM Run the application
 echo Starting ComplegalAI application...
 streamlit run app.py
@@ -37,6 +37,10 @@ if [ ! -f ".env" ]; then
     exit 1
 fi
 
+# Pre-fetch and register the reference documents
+echo "Warming up reference documents..."
+python warmup.py
+
 # Run the application
 echo "Starting ComplegalAI application..."
 streamlit run app.py
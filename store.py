@@ -0,0 +1,366 @@
+"""
+Shared state for ComplegalAI.
+
+Everything that has to be shared between sessions and between replicas lives
+in one SQLite database on the shared volume: report history, the registry of
+uploaded reference documents, the files this deployment uploaded and the ones
+held by live sessions, a response cache, open circuit breakers and leases
+used to elect a single replica for one-time work such as reference uploads.
+SQLite's WAL mode and busy timeout make concurrent writes from several
+processes safe.
+
+Configuration (environment variables):
+    STATE_DB_PATH        Database file (default history/complegal.db)
+    REPORT_HISTORY_PATH  Legacy JSON history, imported once into the database
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    reports TEXT NOT NULL,
+    prompt TEXT,
+    analysis TEXT,
+    claim_id TEXT
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE TABLE IF NOT EXISTS reference_files (
+    handle_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    expiration_time TEXT,
+    uploaded_at TEXT
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    name TEXT PRIMARY KEY,
+    uploaded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS live_files (
+    name TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS circuits (
+    name TEXT PRIMARY KEY,
+    opened_at REAL NOT NULL,
+    retry_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def owner_id() -> str:
+    """Identify this process (on this host or container) as a lease holder."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def db_path() -> str:
+    return os.getenv("STATE_DB_PATH", os.path.join("history", "complegal.db"))
+
+
+def _legacy_history_path() -> str:
+    return os.getenv("REPORT_HISTORY_PATH", os.path.join("history", "report_history.json"))
+
+
+def connect() -> sqlite3.Connection:
+    """Return this thread's connection to the shared database, creating the schema on first use."""
+    path = db_path()
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    # Connections must not be shared with forked children
+    key = (path, os.getpid())
+    conn = connections.get(key)
+    if conn is not None:
+        return conn
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Autocommit mode; multi-statement updates use transaction() below
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    with _init_lock:
+        if key not in _initialized:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            _import_legacy_history(conn)
+            _initialized.add(key)
+    connections[key] = conn
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Run statements in a write transaction that blocks other writers until it commits."""
+    conn = connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Bring databases created by older versions up to the current schema."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+    if "claim_id" not in columns:
+        try:
+            conn.execute("ALTER TABLE history ADD COLUMN claim_id TEXT")
+        except sqlite3.OperationalError:
+            # Another process added it first
+            pass
+    conn.execute("CREATE INDEX IF NOT EXISTS history_claim_id ON history (claim_id)")
+
+
+def _import_legacy_history(conn: sqlite3.Connection):
+    """Copy entries from the old JSON history file into the database (once)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        done = conn.execute("SELECT value FROM meta WHERE key = 'legacy_history_imported'").fetchone()
+        legacy_path = _legacy_history_path()
+        if done is None and os.path.exists(legacy_path):
+            with open(legacy_path, "r") as f:
+                entries = json.load(f)
+            conn.executemany(
+                "INSERT INTO history (timestamp, reports, prompt, analysis, claim_id) VALUES (?, ?, ?, ?, ?)",
+                [_history_values(e) for e in entries],
+            )
+        if done is None:
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_history_imported', ?)", (str(time.time()),))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# Report history
+
+def _history_entry(row) -> dict:
+    entry = {"id": row["id"], "timestamp": row["timestamp"], "reports": json.loads(row["reports"])}
+    # Older entries were saved without a prompt or analysis
+    if row["prompt"] is not None:
+        entry["prompt"] = row["prompt"]
+    if row["analysis"] is not None:
+        entry["analysis"] = row["analysis"]
+    if row["claim_id"] is not None:
+        entry["claim_id"] = row["claim_id"]
+    return entry
+
+
+def _history_values(entry: dict) -> tuple:
+    return (entry["timestamp"], json.dumps(entry.get("reports", [])), entry.get("prompt"), entry.get("analysis"),
+            entry.get("claim_id"))
+
+
+def add_history_entry(entry: dict) -> int:
+    """Append an entry to the report history and return its ID."""
+    cursor = connect().execute(
+        "INSERT INTO history (timestamp, reports, prompt, analysis, claim_id) VALUES (?, ?, ?, ?, ?)",
+        _history_values(entry),
+    )
+    return cursor.lastrowid
+
+
+def add_history_entries(entries):
+    """Append many entries in a single transaction (for imports and benchmarks)."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO history (timestamp, reports, prompt, analysis, claim_id) VALUES (?, ?, ?, ?, ?)",
+            (_history_values(entry) for entry in entries),
+        )
+
+
+def load_history() -> list:
+    """Return the whole report history, oldest first."""
+    rows = connect().execute("SELECT * FROM history ORDER BY id").fetchall()
+    return [_history_entry(row) for row in rows]
+
+
+def iter_history(start: str = None, end: str = None, batch_size: int = 500, claim_id: str = None,
+                 report: str = None):
+    """Yield history entries oldest first, reading batch_size rows at a time.
+
+    start and end are inclusive "YYYY-MM-DD[ HH:MM:SS]" bounds on the timestamp.
+    claim_id matches entries saved for that claim and report matches entries
+    whose report file names contain the given text.
+    """
+    conditions, params = [], []
+    if start:
+        conditions.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        conditions.append("timestamp <= ?")
+        # A bare date includes the whole day
+        params.append(end + " 23:59:59" if len(end) == 10 else end)
+    if claim_id:
+        conditions.append("claim_id = ?")
+        params.append(claim_id)
+    if report:
+        conditions.append("reports LIKE ? ESCAPE '\\'")
+        # Report names are stored as JSON, so match their JSON-escaped form
+        escaped = json.dumps(report)[1:-1].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.append(f"%{escaped}%")
+    where = ("AND " + " AND ".join(conditions)) if conditions else ""
+
+    last_id = 0
+    conn = connect()
+    while True:
+        rows = conn.execute(
+            f"SELECT * FROM history WHERE id > ? {where} ORDER BY id LIMIT ?",
+            [last_id] + params + [batch_size],
+        ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield _history_entry(row)
+        last_id = rows[-1]["id"]
+
+
+# Reference document registry
+
+def get_reference(handle_key: str):
+    row = connect().execute("SELECT * FROM reference_files WHERE handle_key = ?", (handle_key,)).fetchone()
+    return dict(row) if row else None
+
+
+def put_reference(handle_key: str, name: str, expiration_time: str, uploaded_at: str):
+    connect().execute(
+        "INSERT OR REPLACE INTO reference_files (handle_key, name, expiration_time, uploaded_at) VALUES (?, ?, ?, ?)",
+        (handle_key, name, expiration_time, uploaded_at),
+    )
+
+
+def all_references() -> dict:
+    rows = connect().execute("SELECT * FROM reference_files").fetchall()
+    return {row["handle_key"]: dict(row) for row in rows}
+
+
+# Files uploaded by this deployment
+
+def record_uploads(file_names):
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO uploads (name, uploaded_at) VALUES (?, ?)",
+            [(name, now) for name in file_names if name],
+        )
+
+
+def forget_uploads(file_names):
+    with transaction() as conn:
+        conn.executemany("DELETE FROM uploads WHERE name = ?", [(name,) for name in file_names])
+
+
+def uploaded_files() -> dict:
+    rows = connect().execute("SELECT * FROM uploads").fetchall()
+    return {row["name"]: row["uploaded_at"] for row in rows}
+
+
+# Files held by live sessions
+
+def mark_live(file_names, session_id: str):
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO live_files (name, session_id, last_seen) VALUES (?, ?, ?)",
+            [(name, session_id, now) for name in file_names if name],
+        )
+
+
+def release_session(session_id: str):
+    connect().execute("DELETE FROM live_files WHERE session_id = ?", (session_id,))
+
+
+def live_files(since: float) -> dict:
+    rows = connect().execute("SELECT * FROM live_files WHERE last_seen >= ?", (since,)).fetchall()
+    return {row["name"]: {"session_id": row["session_id"], "last_seen": row["last_seen"]} for row in rows}
+
+
+# Response cache
+
+def cache_get(key: str):
+    """Return a cached value, or None if it is missing or expired."""
+    row = connect().execute(
+        "SELECT value FROM response_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+        (key, time.time()),
+    ).fetchone()
+    return json.loads(row["value"]) if row else None
+
+
+def cache_put(key: str, value, ttl: float = None):
+    """Store a JSON-serialisable value, optionally expiring after ttl seconds."""
+    now = time.time()
+    connect().execute(
+        "INSERT OR REPLACE INTO response_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+        (key, json.dumps(value), now, now + ttl if ttl else None),
+    )
+
+
+# Open circuit breakers
+
+def get_circuit(name: str):
+    row = connect().execute("SELECT * FROM circuits WHERE name = ?", (name,)).fetchone()
+    return dict(row) if row else None
+
+
+def open_circuit(name: str, opened_at: float, retry_at: float, last_error: str = None):
+    connect().execute(
+        "INSERT OR REPLACE INTO circuits (name, opened_at, retry_at, last_error) VALUES (?, ?, ?, ?)",
+        (name, opened_at, retry_at, last_error),
+    )
+
+
+def close_circuit(name: str):
+    connect().execute("DELETE FROM circuits WHERE name = ?", (name,))
+
+
+# Leases for one-time work
+
+def acquire_lease(name: str, ttl: float, owner: str = None) -> bool:
+    """Try to become the holder of a named lease; returns True if this owner holds it."""
+    owner = owner or owner_id()
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is not None and row["owner"] != owner and row["expires_at"] > now:
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+            (name, owner, now + ttl),
+        )
+    return True
+
+
+def release_lease(name: str, owner: str = None):
+    connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner or owner_id()))
@@ -0,0 +1,20 @@
+import os
+
+# Keep tests away from the metrics port and span log, and test the breakers as deployed
+os.environ["METRICS_PORT"] = "0"
+os.environ["METRICS_LOG_PATH"] = ""
+os.environ["CIRCUIT_BREAKER_ENABLED"] = "1"
+
+import pytest
+
+import breaker
+
+
+@pytest.fixture(autouse=True)
+def state_db(tmp_path, monkeypatch):
+    """Give every test its own shared state database and fresh circuit breakers."""
+    monkeypatch.setenv("STATE_DB_PATH", str(tmp_path / "complegal.db"))
+    monkeypatch.setenv("REPORT_HISTORY_PATH", str(tmp_path / "report_history.json"))
+    breaker.reset()
+    yield
+    breaker.reset()
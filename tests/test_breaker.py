@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from google.genai import errors
+
+import breaker
+import store
+
+
+def _server_error():
+    return errors.ServerError(503, {"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}})
+
+
+def test_opens_after_consecutive_failures():
+    circuit = breaker.CircuitBreaker("dep", failure_threshold=2, reset_timeout=60)
+    circuit.record_failure(_server_error())
+    assert circuit.state == breaker.CLOSED
+    assert circuit.allow()
+    circuit.record_failure(_server_error())
+    assert circuit.state == breaker.OPEN
+    assert not circuit.allow()
+
+
+def test_success_resets_failure_count():
+    circuit = breaker.CircuitBreaker("dep", failure_threshold=2, reset_timeout=60)
+    circuit.record_failure(_server_error())
+    circuit.record_success()
+    circuit.record_failure(_server_error())
+    assert circuit.state == breaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    circuit = breaker.CircuitBreaker("dep", failure_threshold=1, reset_timeout=0.05)
+    circuit.record_failure(_server_error())
+    time.sleep(0.1)
+    assert circuit.allow()
+    assert circuit.state == breaker.HALF_OPEN
+    # Only one probe at a time
+    assert not circuit.allow()
+    circuit.record_success()
+    assert circuit.state == breaker.CLOSED
+    assert circuit.allow()
+
+
+def test_failed_probe_reopens():
+    circuit = breaker.CircuitBreaker("dep", failure_threshold=1, reset_timeout=0.05)
+    circuit.record_failure(_server_error())
+    time.sleep(0.1)
+    assert circuit.allow()
+    circuit.record_failure(_server_error())
+    assert circuit.state == breaker.OPEN
+    assert not circuit.allow()
+
+
+def test_guard_only_counts_outages():
+    bad_request = errors.ClientError(400, {"error": {"code": 400, "message": "bad", "status": "INVALID_ARGUMENT"}})
+    for _ in range(breaker.FAILURE_THRESHOLD + 1):
+        with pytest.raises(errors.ClientError):
+            with breaker.guard("dep"):
+                raise bad_request
+    assert breaker.get("dep").state == breaker.CLOSED
+
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        with pytest.raises(errors.ServerError):
+            with breaker.guard("dep"):
+                raise _server_error()
+    with pytest.raises(breaker.CircuitOpenError):
+        with breaker.guard("dep"):
+            pass
+
+
+def test_open_circuit_is_shared_through_the_store():
+    circuit = breaker.get("dep")
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure(_server_error())
+    assert store.get_circuit("dep") is not None
+
+    # A fresh process (or another replica) adopts the open circuit
+    breaker.reset()
+    assert breaker.is_open("dep")
+
+    breaker.get("dep").record_success()
+    assert store.get_circuit("dep") is None
+
+
+def test_wait_returns_early_when_circuit_opens():
+    circuit = breaker.get("dep")
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure(_server_error())
+    start = time.time()
+    assert not breaker.wait(30, "dep", step=0.01)
+    assert time.time() - start < 1
+    assert breaker.wait(0.01, "other")
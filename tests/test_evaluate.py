@@ -0,0 +1,40 @@
+import os
+
+import evaluate
+import export
+
+SAMPLE_CLAIMS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "evals", "claims")
+
+
+def test_sample_claim_runs_against_fake_backend():
+    claims = [claim for claim in evaluate.load_claims(SAMPLE_CLAIMS) if claim["id"] == "sample-lumbar"]
+    variants = [evaluate.resolve_variant({"name": "baseline"}),
+                evaluate.resolve_variant({"name": "no-preprocessing", "preprocess": False})]
+    client = evaluate.make_client("fake")
+    results_cache = {}
+
+    results = evaluate.evaluate(claims, variants, client, "fake", concurrency=2, results_cache=results_cache)
+
+    assert [result["error"] for result in results] == [None, None]
+    assert all(result["scores"]["correct"] for result in results)
+    assert len(results_cache) == 2
+
+    # A second run is served from the results cache
+    again = evaluate.evaluate(claims, variants, client, "fake", results_cache=results_cache)
+    assert all(result["cached"] for result in again)
+
+
+def test_score_flags_wrong_ratings_and_amounts():
+    expected = {"rating_strings": ["15.03.01.00 - 8 - [1.4]11 - 470H - 13 - 15%"], "total_pd_percent": 15,
+                "total_pd_amount": 16000.00}
+    parsed = export.parse_rating_fields("15.03.01.00 - 8 - [1.4]11 - 470H - 13 - 15%\n"
+                                        "16.05.01.00 - 5 - [1.4]7 - 470H - 8 - 9%\n"
+                                        "Total PD: 15% ($14,000.00)")
+
+    scores = evaluate.score(parsed, expected)
+
+    assert scores["ratings_recall"] == 1.0
+    assert scores["ratings_precision"] == 0.5
+    assert scores["pd_percent_correct"] is True
+    assert scores["pd_amount_correct"] is False
+    assert scores["correct"] is False
@@ -0,0 +1,70 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import janitor
+import store
+from fake_gemini import FakeClient
+
+KB = 1024
+
+
+def _upload(client, size=KB, age=None):
+    file = client.files.upload(file=io.BytesIO(b"0" * size))
+    if age is not None:
+        client.backend.files[file.name].create_time = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return file
+
+
+def _remaining(client):
+    return set(client.backend.files)
+
+
+def test_deletes_only_orphaned_files_this_deployment_uploaded():
+    client = FakeClient()
+    orphan = _upload(client, age=3600)
+    foreign = _upload(client, age=3600)
+    janitor.record_uploads([orphan.name])
+
+    result = janitor.sweep_remote(client, min_age=60)
+
+    assert result["orphaned_files"] == 1
+    assert _remaining(client) == {foreign.name}
+    assert store.uploaded_files() == {}
+
+
+def test_keeps_live_and_in_flight_files_over_quota():
+    client = FakeClient()
+    held = _upload(client, age=3600)
+    in_flight = _upload(client)
+    janitor.record_uploads([held.name, in_flight.name])
+    janitor.mark_live([held.name], "session-1")
+
+    for policy in janitor.EVICTION_POLICIES:
+        result = janitor.sweep_remote(client, max_bytes=0, policy=policy, min_age=60)
+        assert result["orphaned_files"] == result["evicted_files"] == 0
+        assert _remaining(client) == {held.name, in_flight.name}
+        assert result["remaining_bytes"] == 2 * KB
+
+
+def test_released_session_files_are_deleted():
+    client = FakeClient()
+    file = _upload(client, age=3600)
+    janitor.record_uploads([file.name])
+    janitor.mark_live([file.name], "session-1")
+    janitor.release("session-1")
+
+    janitor.sweep_remote(client, min_age=60)
+
+    assert _remaining(client) == set()
+
+
+def test_dry_run_deletes_nothing():
+    client = FakeClient()
+    file = _upload(client, age=3600)
+    janitor.record_uploads([file.name])
+
+    result = janitor.sweep_remote(client, min_age=60, dry_run=True)
+
+    assert result["orphaned_files"] == 1
+    assert _remaining(client) == {file.name}
+    assert file.name in store.uploaded_files()
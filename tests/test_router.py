@@ -0,0 +1,61 @@
+import pytest
+
+import breaker
+import router
+from fake_gemini import DEFAULT_RESPONSE, FakeClient, FakeGeminiBackend
+
+INVALID = "The report does not contain enough detail to rate."
+
+
+def _calls(backend):
+    return backend.calls.get("chats.send_message", 0)
+
+
+def test_falls_back_when_a_model_is_down():
+    backend = FakeGeminiBackend(failing_models=[router.FLASH_MODEL])
+    chat, model, response = router.send_message(FakeClient(backend), None, None, "Rate the report", route="fast")
+    assert model == router.FALLBACK_MODEL
+    assert response.text == DEFAULT_RESPONSE
+    assert _calls(backend) == 2
+
+
+def test_invalid_answer_escalates_to_stronger_route():
+    backend = FakeGeminiBackend(model_responses={router.FLASH_MODEL: INVALID})
+    _, model, response = router.send_message(FakeClient(backend), None, None, "Rate the report",
+                                             route="structured", validator="rating")
+    assert model == router.PRO_MODEL
+    assert router.is_valid(response.text, "rating")
+    # Flash answered, so the weaker fallback on the same route is skipped
+    assert _calls(backend) == 2
+
+
+def test_returns_strongest_answer_when_none_is_valid():
+    backend = FakeGeminiBackend(response_text=INVALID)
+    _, model, response = router.send_message(FakeClient(backend), None, None, "Rate the report",
+                                             route="structured", validator="rating")
+    assert model == router.PRO_MODEL
+    assert response.text == INVALID
+    assert _calls(backend) == 2
+
+
+def test_skips_model_with_open_circuit():
+    circuit = breaker.get(f"generate:{router.FLASH_MODEL}")
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure(RuntimeError("unavailable"))
+    backend = FakeGeminiBackend()
+    _, model, _ = router.send_message(FakeClient(backend), None, None, "Rate the report", route="fast")
+    assert model == router.FALLBACK_MODEL
+    assert _calls(backend) == 1
+
+
+def test_raises_last_error_when_every_model_fails():
+    backend = FakeGeminiBackend(failing_models=[router.FLASH_MODEL, router.FALLBACK_MODEL])
+    with pytest.raises(Exception) as excinfo:
+        router.send_message(FakeClient(backend), None, None, "Rate the report", route="fast")
+    assert getattr(excinfo.value, "code", None) == 503
+
+
+def test_empty_route_raises_value_error():
+    routes = {"empty": {"models": [], "timeout": 10}}
+    with pytest.raises(ValueError):
+        router.send_message(FakeClient(), None, None, "Rate the report", route="empty", routes=routes)
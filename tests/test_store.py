@@ -0,0 +1,32 @@
+import store
+
+
+def _entry(i, claim_id=None):
+    return {"timestamp": f"2025-01-{i:02d} 12:00:00", "reports": [f"report_{i}.pdf"], "prompt": "Rate",
+            "analysis": f"analysis {i}", "claim_id": claim_id}
+
+
+def test_iter_history_pages_through_every_entry():
+    store.add_history_entries(_entry(i) for i in range(1, 26))
+
+    entries = list(store.iter_history(batch_size=7))
+
+    assert [entry["analysis"] for entry in entries] == [f"analysis {i}" for i in range(1, 26)]
+    assert len({entry["id"] for entry in entries}) == 25
+
+
+def test_iter_history_filters_across_batches():
+    store.add_history_entries(_entry(i, claim_id="A" if i % 2 else "B") for i in range(1, 21))
+
+    claim_a = list(store.iter_history(batch_size=3, claim_id="A"))
+    assert [entry["reports"] for entry in claim_a] == [[f"report_{i}.pdf"] for i in range(1, 21, 2)]
+
+    # A bare end date includes that whole day
+    dated = list(store.iter_history("2025-01-05", "2025-01-09", batch_size=2))
+    assert [entry["timestamp"][:10] for entry in dated] == [f"2025-01-{i:02d}" for i in range(5, 10)]
+
+    assert [entry["analysis"] for entry in store.iter_history(report="report_13", batch_size=4)] == ["analysis 13"]
+
+
+def test_iter_history_empty():
+    assert list(store.iter_history(batch_size=5)) == []
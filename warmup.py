@@ -0,0 +1,66 @@
+"""
+Warm-up script for ComplegalAI.
+
+Run at container start (before `streamlit run`) to download the reference
+PDFs and register them with the Gemini Files API, so the first user after a
+deploy doesn't pay for it. Failures are reported but never block the app
+from starting; the app falls back to loading the references itself.
+"""
+
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+import references
+
+
+def get_api_key():
+    """Read the Gemini API key from the environment or .streamlit/secrets.toml."""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key and api_key != "your_api_key_here":
+        return api_key
+
+    secrets_path = os.path.join(".streamlit", "secrets.toml")
+    if not os.path.exists(secrets_path):
+        return None
+    try:
+        import tomllib
+        with open(secrets_path, "rb") as f:
+            return tomllib.load(f).get("GEMINI_API_KEY")
+    except ImportError:
+        # Python < 3.11; toml is installed with streamlit
+        import toml
+        return toml.load(secrets_path).get("GEMINI_API_KEY")
+
+
+def warm_up():
+    """Register the reference documents and print how long each one took."""
+    api_key = get_api_key()
+    if not api_key:
+        print("Warm-up skipped: no Gemini API key found.")
+        return False
+
+    start = time.perf_counter()
+    from google import genai
+    client = genai.Client(api_key=api_key)
+    print(f"Imported Gemini SDK and created client in {time.perf_counter() - start:.2f}s")
+
+    try:
+        timings = references.warm_up(client)
+    except Exception as e:
+        print(f"Warm-up failed: {str(e)}")
+        return False
+
+    for key, seconds in timings.items():
+        print(f"Registered {references.REFERENCE_DOCUMENTS[key]['label']} in {seconds:.2f}s")
+    print(f"Warm-up complete in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    warm_up()
+    # Always exit cleanly so the app still starts if the warm-up fails
+    sys.exit(0)